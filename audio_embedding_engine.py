@@ -0,0 +1,78 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import librosa
+
+from audio_feature_extractor import AudioFeatureExtractor
+from embedding_store import EmbeddingStore
+
+
+# Extractor owned by a process pool worker, see init_audio_worker
+worker_extractor = None
+worker_batch_size = 1
+
+
+def init_audio_worker(audio_model_name, device, torch_threads, batch_size):
+    global worker_extractor, worker_batch_size
+
+    import torch
+
+    # every worker runs its own model, so each one only gets its share of the cores
+    torch.set_num_threads(torch_threads)
+    worker_extractor = AudioFeatureExtractor(audio_model_name, device)
+    worker_batch_size = batch_size
+
+
+def embed_in_worker(file_path):
+    duration = librosa.get_duration(path=file_path)
+    # decoding of the next chunks overlaps with the model, the embedding is the same as the sequential one
+    embedding = worker_extractor.extract_long_audio_embedding_pipelined(file_path, batch_size=worker_batch_size)
+    return file_path, embedding, duration
+
+
+def embed_audio_files(file_paths, audio_model_name, device="cpu", num_workers=2, store=None, batch_size=1):
+    """
+        Yields (file_path, file_key, embedding) for every file, in completion order. Files whose content was already embedded
+        with the same model are read back from the embedding store, the others are spread across num_workers
+        processes and added to the store as soon as they are ready. batch_size is the number of chunks per forward
+        pass in each worker: the peak memory of the pool grows with batch_size * num_workers.
+    """
+    if store is None:
+        store = EmbeddingStore()
+
+    pending = []
+    file_keys = {}
+    for file_path in file_paths:
+        file_keys[file_path] = EmbeddingStore.file_key(file_path, audio_model_name)
+        embedding = store.get(file_keys[file_path])
+        if embedding is None:
+            pending.append(file_path)
+        else:
+            yield file_path, file_keys[file_path], embedding
+
+    print(f"{len(file_paths) - len(pending)} audio embeddings found in the store, {len(pending)} to compute")
+    if not pending:
+        return
+
+    torch_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    audio_seconds = 0.0
+    start_time = time.perf_counter()
+
+    # the pool is started inside the batch writer, whose threads may have requests in flight: forking a process
+    # with running threads can deadlock the workers, spawned workers start from a clean interpreter
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             mp_context=get_context("spawn"),
+                             initializer=init_audio_worker,
+                             initargs=(audio_model_name, device, torch_threads, batch_size)) as executor:
+        futures = [executor.submit(embed_in_worker, file_path) for file_path in pending]
+        for future in as_completed(futures):
+            file_path, embedding, duration = future.result()
+            store.add(file_keys[file_path], embedding, item_id=os.path.basename(file_path))
+            audio_seconds += duration
+            yield file_path, file_keys[file_path], embedding
+
+    elapsed_time = time.perf_counter() - start_time
+    print(f"Embedded {len(pending)} files in {elapsed_time:.1f}s: "
+          f"{len(pending) / elapsed_time:.2f} files/s, {audio_seconds / elapsed_time:.1f} audio s/s")
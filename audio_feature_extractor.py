@@ -1,19 +1,30 @@
+import queue
+import threading
+import time
+
 import librosa
 import numpy as np
 import torch.cuda
 from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2Model
 
+import tracing
+
 
 class AudioFeatureExtractor:
     feature_extractor = None
     audio_model = None
     device = None
+    pipeline_stats = None  # stall and idle times of the last pipelined extraction
 
     def __init__(self, audio_model_name, device="cpu"):
         self.feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(audio_model_name, device=device)
         self.audio_model = Wav2Vec2Model.from_pretrained(audio_model_name).to(device)
         self.device = device
 
+    @staticmethod
+    def get_duration(file_path):
+        return librosa.get_duration(path=file_path)
+
     def _get_audio_streams(self, file_path, original_sample_rate, chunk_size_seconds=60):
         frame_length = int(original_sample_rate)
         hop_length = int(original_sample_rate)  # no striding
@@ -25,22 +36,35 @@ class AudioFeatureExtractor:
 
         return audio_streams
 
-    def extract_long_audio_embedding(self, file_path) -> np.array:
+    def iter_chunk_embeddings(self, file_path, chunk_size_seconds=60):
+        """
+            Embeds the file one chunk at a time, so that the caller can use the first chunks while the others are
+            still to be decoded
+        :return: generator of (chunk embedding, seconds of audio in the chunk)
+        """
         original_sample_rate = librosa.get_samplerate(file_path)
         resample_sample_rate = self.feature_extractor.sampling_rate
 
-        chunk_embeddings = []  # contains the features for each 60 seconds long audio chunk
-        splitted_audio_chunks = self._get_audio_streams(file_path, original_sample_rate, chunk_size_seconds=60)
-        for audio_chunk in splitted_audio_chunks:
+        splitted_audio_chunks = self._get_audio_streams(file_path, original_sample_rate, chunk_size_seconds)
+        while True:
+            # the stream decodes the next chunk only when it is asked for it
+            with tracing.span("audio.decode"):
+                audio_chunk = next(splitted_audio_chunks, None)
+            if audio_chunk is None:
+                break
+            chunk_seconds = len(audio_chunk) / original_sample_rate
+
             # resample the chunk and convert it to a pytorch tensor
-            audio_chunk = librosa.resample(audio_chunk, orig_sr=original_sample_rate, target_sr=resample_sample_rate)
+            with tracing.span("audio.resample"):
+                audio_chunk = librosa.resample(audio_chunk, orig_sr=original_sample_rate,
+                                               target_sr=resample_sample_rate)
             audio_chunk = torch.tensor(audio_chunk).to(self.device)
 
             # extract the features to feed the audio model
             extractor_data = self.feature_extractor(audio_chunk, sampling_rate=self.feature_extractor.sampling_rate,
                                                     padding=True, return_tensors="pt")
 
-            with torch.no_grad():
+            with torch.no_grad(), tracing.span("audio.forward"):
                 try:
                     # get audio model features
                     model_output = self.audio_model(extractor_data.input_values.to(self.device))
@@ -51,10 +75,203 @@ class AudioFeatureExtractor:
 
                     chunk_features = torch.mean(model_output.extract_features, axis=1)
                     chunk_features = np.array(chunk_features.cpu())  # convert the 512 elements array to numpy
-                    chunk_embeddings.append(chunk_features)
-                except:
-                    print("Chunk processing error")
+                except Exception as error:
+                    print(f"Chunk processing error: {error}")
+                    continue
+            yield chunk_features, chunk_seconds
+
+    def extract_long_audio_embedding(self, file_path) -> np.array:
+        # contains the features for each 60 seconds long audio chunk
+        chunk_embeddings = [chunk_features for chunk_features, _ in self.iter_chunk_embeddings(file_path, 60)]
 
         # combines the features of each 60 seconds long chunk by averaging the embeddings
         file_embedding = np.mean(chunk_embeddings, axis=0)
         return file_embedding
+
+    def _embed_chunk_batch(self, audio_chunks) -> np.array:
+        sampling_rate = self.feature_extractor.sampling_rate
+
+        # each chunk is normalized on its own samples, exactly like the single chunk path does
+        chunk_lengths = [len(audio_chunk) for audio_chunk in audio_chunks]
+        input_values = np.zeros((len(audio_chunks), max(chunk_lengths)), dtype=np.float32)
+        attention_mask = np.zeros((len(audio_chunks), max(chunk_lengths)), dtype=np.int64)
+        for i, audio_chunk in enumerate(audio_chunks):
+            extractor_data = self.feature_extractor(audio_chunk, sampling_rate=sampling_rate, return_tensors="np")
+            input_values[i, :chunk_lengths[i]] = extractor_data.input_values[0]
+            attention_mask[i, :chunk_lengths[i]] = 1
+
+        with torch.no_grad(), tracing.span("audio.forward", batch_size=len(audio_chunks)):
+            model_output = self.audio_model(torch.from_numpy(input_values).to(self.device),
+                                            attention_mask=torch.from_numpy(attention_mask).to(self.device))
+
+            # padded frames must not take part in the mean over the chunk
+            frame_counts = self.audio_model._get_feat_extract_output_lengths(torch.tensor(chunk_lengths))
+            frame_counts = frame_counts.to(self.device)
+            frames = model_output.extract_features.shape[1]
+            frame_mask = torch.arange(frames, device=self.device)[None, :] < frame_counts[:, None]
+            frame_mask = frame_mask.unsqueeze(-1).to(model_output.extract_features.dtype)
+
+            chunk_features = (model_output.extract_features * frame_mask).sum(axis=1) / frame_mask.sum(axis=1)
+            return np.array(chunk_features.cpu())
+
+    def extract_long_audio_embedding_batched(self, file_path, batch_size=4, chunk_size_seconds=60) -> np.array:
+        sampling_rate = self.feature_extractor.sampling_rate
+
+        # decode and resample the whole file once
+        with tracing.span("audio.decode_resample"):
+            audio, _ = librosa.load(file_path, sr=sampling_rate, mono=True)
+
+        # split in equal length chunks, the stream based extraction drops the last incomplete second as well
+        chunk_length = chunk_size_seconds * sampling_rate
+        audio_chunks = [audio[start:start + chunk_length] for start in range(0, len(audio), chunk_length)]
+        audio_chunks = [audio_chunk for audio_chunk in audio_chunks if len(audio_chunk) >= sampling_rate]
+
+        # models with group normalization in the feature encoder normalize over the whole padded input, so the
+        # shorter chunk is only padded together with the others when the model supports it
+        batches = []
+        full_chunks = [(i, c) for i, c in enumerate(audio_chunks) if len(c) == chunk_length]
+        short_chunks = [(i, c) for i, c in enumerate(audio_chunks) if len(c) != chunk_length]
+        if self.audio_model.config.feat_extract_norm == "layer":
+            full_chunks = full_chunks + short_chunks
+        else:
+            batches.extend([short_chunk] for short_chunk in short_chunks)
+        batches = [full_chunks[start:start + batch_size] for start in range(0, len(full_chunks), batch_size)] + batches
+
+        chunk_embeddings = []
+        for batch in batches:
+            try:
+                chunk_embeddings.extend(self._embed_chunk_batch([audio_chunk for _, audio_chunk in batch]))
+            except Exception:
+                # retry the chunks one by one, so that only the failing ones are lost and reported
+                for chunk_index, audio_chunk in batch:
+                    try:
+                        chunk_embeddings.extend(self._embed_chunk_batch([audio_chunk]))
+                    except Exception as error:
+                        print(f"Chunk {chunk_index} of {file_path} processing error: {error}")
+
+        # combines the features of each chunk by averaging the embeddings, with the same shape as
+        # extract_long_audio_embedding
+        file_embedding = np.mean(chunk_embeddings, axis=0, keepdims=True)
+        return file_embedding
+
+    def _embed_equal_length_chunks(self, audio_chunks) -> list:
+        # Chunks of the same length need no padding: batching them does not change the features of any chunk.
+        # Every chunk is prepared exactly like in iter_chunk_embeddings
+        input_values = torch.cat([
+            self.feature_extractor(torch.tensor(audio_chunk).to(self.device),
+                                   sampling_rate=self.feature_extractor.sampling_rate,
+                                   padding=True, return_tensors="pt").input_values
+            for audio_chunk in audio_chunks
+        ])
+
+        with torch.no_grad(), tracing.span("audio.forward", batch_size=len(audio_chunks)):
+            model_output = self.audio_model(input_values.to(self.device))
+            chunk_features = torch.mean(model_output.extract_features, axis=1)
+            return [np.array(chunk_features[i:i + 1].cpu()) for i in range(len(audio_chunks))]
+
+    def extract_long_audio_embedding_pipelined(self, file_path, batch_size=4, queue_depth=4, max_queue_bytes=None,
+                                               chunk_size_seconds=60) -> np.array:
+        """
+            Same embedding as extract_long_audio_embedding, but a producer thread decodes and resamples the next
+            chunks while the model runs on the current ones. The model batches the chunks waiting in the queue
+        :param batch_size: maximum number of chunks per forward pass
+        :param queue_depth: maximum number of resampled chunks waiting in the queue
+        :param max_queue_bytes: optional cap on the memory held by the queue, it can lower queue_depth
+        :return: the file embedding; the stall and idle times of both sides of the queue are in pipeline_stats
+        """
+        original_sample_rate = librosa.get_samplerate(file_path)
+        resample_sample_rate = self.feature_extractor.sampling_rate
+        if max_queue_bytes is not None:
+            chunk_bytes = chunk_size_seconds * resample_sample_rate * np.dtype(np.float32).itemsize
+            queue_depth = max(1, min(queue_depth, max_queue_bytes // chunk_bytes))
+
+        chunks = queue.Queue(maxsize=queue_depth)  # (resampled chunk, error), (None, None) ends the stream
+        stop = threading.Event()
+        stats = {"queue_depth": queue_depth, "chunks": 0, "batches": 0, "producer_busy": 0.0,
+                 "producer_stall": 0.0, "consumer_busy": 0.0, "consumer_idle": 0.0}
+
+        def put(item):
+            # producer stall: the queue is full because the model is slower than the decoder
+            start_time = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            stats["producer_stall"] += time.perf_counter() - start_time
+
+        def produce():
+            try:
+                audio_streams = self._get_audio_streams(file_path, original_sample_rate, chunk_size_seconds)
+                while not stop.is_set():
+                    start_time = time.perf_counter()
+                    with tracing.span("audio.decode"):
+                        audio_chunk = next(audio_streams, None)
+                    if audio_chunk is None:
+                        break
+                    with tracing.span("audio.resample"):
+                        audio_chunk = librosa.resample(audio_chunk, orig_sr=original_sample_rate,
+                                                       target_sr=resample_sample_rate)
+                    stats["producer_busy"] += time.perf_counter() - start_time
+                    put((audio_chunk, None))
+            except Exception as error:
+                put((None, error))
+                return
+            put((None, None))
+
+        def take():
+            # consumer idle: the queue is empty because the decoder is slower than the model
+            start_time = time.perf_counter()
+            item = chunks.get()
+            stats["consumer_idle"] += time.perf_counter() - start_time
+            return item
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        chunk_embeddings = []
+        held_item = None  # taken from the queue, but it could not join the previous batch
+        try:
+            while True:
+                audio_chunk, error = held_item if held_item is not None else take()
+                held_item = None
+                if error is not None:
+                    raise error
+                if audio_chunk is None:
+                    break
+
+                # the chunks already waiting in the queue join the batch, as long as they have the same length
+                batch = [audio_chunk]
+                while len(batch) < batch_size:
+                    try:
+                        item = chunks.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item[0] is None or len(item[0]) != len(audio_chunk):
+                        held_item = item
+                        break
+                    batch.append(item[0])
+
+                start_time = time.perf_counter()
+                try:
+                    chunk_embeddings.extend(self._embed_equal_length_chunks(batch))
+                except Exception:
+                    # retry the chunks one by one, so that only the failing ones are lost and reported
+                    for single_chunk in batch:
+                        try:
+                            chunk_embeddings.extend(self._embed_equal_length_chunks([single_chunk]))
+                        except Exception as error:
+                            print(f"Chunk processing error: {error}")
+                stats["consumer_busy"] += time.perf_counter() - start_time
+                stats["chunks"] += len(batch)
+                stats["batches"] += 1
+        finally:
+            stop.set()
+            producer.join()
+            self.pipeline_stats = stats
+
+        # combines the features of each chunk by averaging the embeddings, in the same order as
+        # extract_long_audio_embedding
+        file_embedding = np.mean(chunk_embeddings, axis=0)
+        return file_embedding
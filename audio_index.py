@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from query_cache import read_schema_version
+
+
+audio_index_dir = "cache/audio_index/"
+
+# Metrics that reduce to a single matrix product, the others are left to Weaviate
+supported_metrics = ["cosine", "dot", "l2", "l2-squared"]
+
+
+class AudioIndex:
+    """
+        Exact, in-process nearest neighbour search over the TedTalkAudio vectors. All the vectors are kept in one
+        contiguous matrix of unit-length float32 rows, next to their norms and the uuids of the talks they belong
+        to, so a query is one matrix-vector product and an argpartition. The matrix is cached on disk and synced
+        again from Weaviate when system_init changes the database.
+    """
+    index_dir = None
+
+    def __init__(self, index_dir=audio_index_dir, page_size=500):
+        self.index_dir = index_dir
+        self.page_size = page_size
+        self.schema_version = None
+        self.remote_count = 0  # TedTalkAudio objects seen by the last sync, with or without a talk
+        # (vectors, norms, talk uuids) is replaced as a whole, so a search never mixes two syncs
+        self._state = (None, None, [])
+        self.lock = threading.Lock()
+
+        self._vectors_path = os.path.join(self.index_dir, "vectors.npy")
+        self._norms_path = os.path.join(self.index_dir, "norms.npy")
+        self._metadata_path = os.path.join(self.index_dir, "metadata.json")
+
+    @property
+    def vectors(self):
+        return self._state[0]
+
+    @property
+    def norms(self):
+        return self._state[1]
+
+    @property
+    def talk_uuids(self):
+        return self._state[2]
+
+    def __len__(self):
+        return len(self._state[2])
+
+    @staticmethod
+    def count_remote(client):
+        response = client.query.aggregate("TedTalkAudio").with_meta_count().do()
+        return response["data"]["Aggregate"]["TedTalkAudio"][0]["meta"]["count"]
+
+    def load(self):
+        if not os.path.exists(self._metadata_path):
+            return False
+        with open(self._metadata_path, "r", encoding="utf-8") as metadata_file:
+            metadata = json.load(metadata_file)
+        vectors = np.load(self._vectors_path)
+        norms = np.load(self._norms_path)
+        if len(vectors) != len(metadata["talk_uuids"]):
+            return False  # files of two different syncs
+        self._state = (vectors, norms, metadata["talk_uuids"])
+        self.schema_version = metadata["schema_version"]
+        self.remote_count = metadata.get("remote_count", len(vectors))
+        return True
+
+    @staticmethod
+    def _save_array(path, array):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as array_file:
+            np.save(array_file, array)
+        os.replace(temporary_path, path)
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors, norms, talk_uuids = self._state
+        self._save_array(self._vectors_path, vectors)
+        self._save_array(self._norms_path, norms)
+        # the metadata is written last: it is what marks the cached index as complete
+        temporary_path = self._metadata_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as metadata_file:
+            json.dump({"talk_uuids": talk_uuids, "schema_version": self.schema_version,
+                       "remote_count": self.remote_count}, metadata_file)
+        os.replace(temporary_path, self._metadata_path)
+
+    def sync(self, client):
+        # Reads every TedTalkAudio object with cursor pagination, which never goes through the vector index
+        with self.lock:
+            self._sync(client)
+
+    def _sync(self, client):
+        schema_version = read_schema_version()
+        vectors = []
+        talk_uuids = []
+        remote_count = 0
+        cursor = None
+        while True:
+            query = client.query\
+                .get("TedTalkAudio", ["talk_entry { ... on TedTalk { _additional { id } } }"])\
+                .with_additional(["id", "vector"])\
+                .with_limit(self.page_size)
+            if cursor is not None:
+                query = query.with_after(cursor)
+            page = query.do()["data"]["Get"]["TedTalkAudio"]
+            if not page:
+                break
+
+            remote_count += len(page)
+            for ted_talk_audio in page:
+                # an audio whose talk reference is missing cannot be returned as a talk
+                if ted_talk_audio.get("talk_entry"):
+                    vectors.append(ted_talk_audio["_additional"]["vector"])
+                    talk_uuids.append(ted_talk_audio["talk_entry"][0]["_additional"]["id"])
+            cursor = page[-1]["_additional"]["id"]
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(talk_uuids), -1)
+        norms = np.linalg.norm(vectors, axis=1)
+        vectors = np.ascontiguousarray(vectors / np.maximum(norms, 1e-12)[:, None])
+        self._state = (vectors, norms.astype(np.float32), talk_uuids)
+        self.schema_version = schema_version
+        self.remote_count = remote_count
+        self.save()
+
+    def ensure_synced(self, client):
+        # The cached matrix is reused while the database has not changed since it was built. The object count is
+        # compared only when the cache is loaded from disk, checking the schema version file is enough afterwards
+        with self.lock:
+            if self.vectors is None:
+                if not self.load() or self.schema_version != read_schema_version() \
+                        or self.remote_count != self.count_remote(client):
+                    self._sync(client)
+            elif self.schema_version != read_schema_version():
+                self._sync(client)
+
+    @staticmethod
+    def distances(vectors, norms, query_vector, metric):
+        query_vector = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        query_norm = max(float(np.linalg.norm(query_vector)), 1e-12)
+        cosines = vectors @ (query_vector / query_norm)
+
+        # the distances are the ones Weaviate would return for the same metric
+        if metric == "cosine":
+            return 1.0 - cosines
+        if metric == "dot":
+            return -cosines * norms * query_norm
+        if metric in ("l2", "l2-squared"):
+            return norms ** 2 - 2.0 * cosines * norms * query_norm + query_norm ** 2
+        raise ValueError(f"The {metric} metric is not supported by the local audio index")
+
+    def search(self, query_vector, limit, metric="cosine"):
+        """
+            Exact top-k search
+        :return: list of (talk uuid, distance) pairs, the closest first
+        """
+        vectors, norms, talk_uuids = self._state  # one consistent snapshot, even if a sync runs meanwhile
+        if not talk_uuids or limit <= 0:
+            return []
+
+        distances = self.distances(vectors, norms, query_vector, metric)
+        limit = min(limit, len(distances))
+        top_rows = np.argpartition(distances, limit - 1)[:limit]
+        top_rows = top_rows[np.argsort(distances[top_rows])]
+        return [(talk_uuids[row], float(distances[row])) for row in top_rows]
@@ -0,0 +1,128 @@
+import argparse
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import weaviate
+
+import main
+from query_cache import QueryCache
+
+
+modes = ["semantic", "hybrid", "qna", "audio"]
+
+# The summarizer pipeline and the audio model are shared by all the workers, one query at a time
+summarizer_lock = threading.Lock()
+audio_lock = threading.Lock()
+
+
+def summarize_results(client, talks):
+    main.fetch_missing_transcripts(client, talks)
+    with summarizer_lock:
+        return main.cached_summarize_many(talks)
+
+
+def run_query(client, device, record, with_summaries):
+    mode = record["mode"]
+    limit = record.get("limit", 3)
+
+    if mode == "semantic":
+        talks = main.semantic_search_results(client, record["text"], limit)
+    elif mode == "hybrid":
+        talks = main.hybrid_search_results(client, record["text"], limit)
+    elif mode == "qna":
+        results = main.question_and_answer_results(client, record["text"], limit)
+        return [{
+            "talk_id": result["talk_id"],
+            "title": result["title"],
+            "answer": result["_additional"]["answer"]
+        } for result in results]
+    elif mode == "audio":
+        with audio_lock:
+            audio_features = main.get_audio_embedding(record["audio_path"], device)
+        talks = main.audio_search_results(client, audio_features, limit)
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {modes}")
+
+    output = [{"talk_id": talk["talk_id"], "title": talk["title"], "url": talk["url"]} for talk in talks]
+    if with_summaries and talks:
+        for talk_output, summary in zip(output, summarize_results(client, talks)):
+            talk_output["summary"] = summary
+    return output
+
+
+def timed_run(client, device, record, with_summaries):
+    start_time = time.perf_counter()
+    output = {"id": record.get("id"), "mode": record.get("mode")}
+    try:
+        output["results"] = run_query(client, device, record, with_summaries)
+    except Exception as error:
+        output["error"] = f"{type(error).__name__}: {error}"
+    output["latency"] = time.perf_counter() - start_time
+    return output
+
+
+def percentile(sorted_values, percent):
+    # nearest-rank percentile
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def print_report(outputs, elapsed_time):
+    print(f"{len(outputs)} queries in {elapsed_time:.2f}s ({len(outputs) / elapsed_time:.2f} queries/s)")
+    print(f"{'mode':>10} {'count':>6} {'errors':>6} {'q/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for mode in sorted({output["mode"] for output in outputs}, key=str):
+        mode_outputs = [output for output in outputs if output["mode"] == mode]
+        latencies = sorted(output["latency"] for output in mode_outputs)
+        errors = sum(1 for output in mode_outputs if "error" in output)
+        print(f"{str(mode):>10} {len(mode_outputs):>6} {errors:>6} {len(mode_outputs) / elapsed_time:>8.2f} "
+              f"{percentile(latencies, 50):>7.3f}s {percentile(latencies, 95):>7.3f}s {percentile(latencies, 99):>7.3f}s")
+
+
+def run_workload(client, device, input_path, output_path, concurrency, with_summaries):
+    with open(input_path, "r", encoding="utf-8") as input_file:
+        records = [json.loads(line) for line in input_file if line.strip()]
+    print(f"Running {len(records)} queries with {concurrency} concurrent workers...")
+
+    outputs = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+            open(output_path, "w", encoding="utf-8") as output_file:
+        # results are written in input order, as soon as each one is available
+        for output in executor.map(lambda record: timed_run(client, device, record, with_summaries), records):
+            output_file.write(json.dumps(output, ensure_ascii=False) + "\n")
+            outputs.append(output)
+    elapsed_time = time.perf_counter() - start_time
+
+    if outputs:
+        print_report(outputs, elapsed_time)
+    if main.query_cache is not None:
+        print(f"Query cache: {main.query_cache.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs a JSONL workload of queries without the interactive menu. "
+                                                 "Each line is {\"mode\": \"semantic|hybrid|qna|audio\", "
+                                                 "\"text\": ..., \"audio_path\": ..., \"limit\": 3, \"id\": ...}")
+    parser.add_argument("input_path", help="JSONL file with one query per line")
+    parser.add_argument("output_path", help="JSONL file where the results are written")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of queries running at the same time")
+    parser.add_argument("--summaries", action="store_true", help="also summarize every returned talk")
+    arguments = parser.parse_args()
+
+    device = "cpu"
+    if arguments.summaries:
+        from summary_cache import SummaryCache
+
+        print("Loading the summarizer model in the background...")
+        main.start_summarizer_loading(device)
+        main.summary_cache = SummaryCache()
+
+    client = weaviate.Client("http://localhost:8080")
+    main.load_schema_settings(client)
+    main.query_cache = QueryCache()
+
+    run_workload(client, device, arguments.input_path, arguments.output_path, arguments.concurrency,
+                 arguments.summaries)
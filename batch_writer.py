@@ -0,0 +1,264 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tracing
+
+
+class AdaptiveBatchWriter:
+    """
+        Drop-in replacement for weaviate's client.batch in the ingest stages (add_data_object, add_reference and the
+        context manager). Batch size and the number of concurrent requests follow the measured round-trip latency:
+        they grow while the server answers quickly and shrink when it slows down or fails, e.g. because the
+        vectorizer is falling behind. Adding an object blocks while too many requests are in flight, so the
+        producer never runs far ahead of the server. Failed objects and references are retried.
+    """
+
+    def __init__(self, client, initial_batch_size=32, min_batch_size=1, max_batch_size=512, max_concurrency=8,
+                 target_latency=2.0, max_retries=3, report_interval=1.0):
+        self.client = client
+        self.batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.concurrency = 2
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+
+        self._objects = []  # (attempt, object)
+        self._references = []  # (attempt, class name, reference)
+        self._in_flight = set()
+        self._object_requests = 0
+        self._condition = threading.Condition()
+        self._executor = None
+
+        self.class_stats = {}
+        self.errors = 0
+        self._objects_done = 0
+        self._references_done = 0
+        self._start_time = None
+        self._last_report = 0.0
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self.print_report()
+
+    def _stats(self, class_name):
+        return self.class_stats.setdefault(class_name, {"stored": 0, "references": 0, "failed": 0, "retried": 0})
+
+    def add_data_object(self, data_object, class_name, uuid=None, vector=None):
+        weaviate_object = {"class": class_name, "properties": data_object}
+        if uuid is not None:
+            weaviate_object["id"] = str(uuid)
+        if vector is not None:
+            weaviate_object["vector"] = np.asarray(vector, dtype=np.float32).reshape(-1).tolist()
+
+        with self._condition:
+            self._objects.append((0, weaviate_object))
+        if len(self._objects) >= self.batch_size:
+            self._send_objects()
+
+    def add_reference(self, from_object_uuid, from_object_class_name, from_property_name, to_object_uuid,
+                      to_object_class_name=None):
+        to_beacon = f"weaviate://localhost/{to_object_uuid}"
+        if to_object_class_name is not None:
+            to_beacon = f"weaviate://localhost/{to_object_class_name}/{to_object_uuid}"
+        reference = {
+            "from": f"weaviate://localhost/{from_object_class_name}/{from_object_uuid}/{from_property_name}",
+            "to": to_beacon
+        }
+
+        with self._condition:
+            self._references.append((0, from_object_class_name, reference))
+        if len(self._references) >= self.batch_size:
+            self._send_references()
+
+    def add_references(self, edges, from_object_class_name, from_property_name, to_object_class_name):
+        # Bulk version of add_reference for an array of (from_uuid, to_uuid) pairs
+        references = [
+            (0, from_object_class_name, {
+                "from": f"weaviate://localhost/{from_object_class_name}/{from_uuid}/{from_property_name}",
+                "to": f"weaviate://localhost/{to_object_class_name}/{to_uuid}"
+            })
+            for from_uuid, to_uuid in edges
+        ]
+        with self._condition:
+            self._references.extend(references)
+        while len(self._references) >= self.batch_size:
+            self._send_references()
+
+    def flush(self):
+        self._flush_objects()
+        while True:
+            with self._condition:
+                if not self._references and not self._in_flight:
+                    break
+            self._send_references()
+            self._wait_for_in_flight(0)
+
+    def _flush_objects(self):
+        # objects first: a reference can only be created once its source object exists
+        while True:
+            with self._condition:
+                if not self._objects and self._object_requests == 0:
+                    break
+            self._send_objects()
+            self._wait_for_in_flight(0)
+
+    def _wait_for_in_flight(self, limit):
+        with self._condition:
+            while len(self._in_flight) > limit:
+                self._condition.wait()
+
+    def _submit(self, function, items, is_object_request):
+        # backpressure: the caller blocks until one of the in-flight requests completes
+        self._wait_for_in_flight(self.concurrency - 1)
+        with self._condition:
+            future = self._executor.submit(function, items)
+            self._in_flight.add(future)
+            if is_object_request:
+                self._object_requests += 1
+        future.add_done_callback(lambda done: self._on_done(done, items, is_object_request))
+
+    def _on_done(self, future, items, is_object_request):
+        error = future.exception()
+        if error is not None:
+            # the request function itself crashed, e.g. on an unexpected response: none of its items is lost. They
+            # are queued again before the request leaves the in-flight set, so that a flush waiting on it sees them
+            if is_object_request:
+                for attempt, weaviate_object in items:
+                    self._retry_or_fail(self._objects, (attempt + 1, weaviate_object), weaviate_object["class"],
+                                        attempt, error)
+            else:
+                for attempt, class_name, reference in items:
+                    self._retry_or_fail(self._references, (attempt + 1, class_name, reference), class_name,
+                                        attempt, error)
+
+        with self._condition:
+            self._in_flight.discard(future)
+            if is_object_request:
+                self._object_requests -= 1
+            self._condition.notify_all()
+
+    def _take(self, queue):
+        with self._condition:
+            items = queue[:self.batch_size]
+            del queue[:self.batch_size]
+        return items
+
+    def _send_objects(self):
+        items = self._take(self._objects)
+        if items:
+            self._submit(self._post_objects, items, True)
+
+    def _send_references(self):
+        with self._condition:
+            objects_pending = bool(self._objects) or self._object_requests > 0
+        if objects_pending:
+            self._flush_objects()
+
+        items = self._take(self._references)
+        if items:
+            self._submit(self._post_references, items, False)
+
+    def _post(self, path, payload):
+        start_time = time.perf_counter()
+        try:
+            with tracing.span("batch" + path):
+                response = self.client._connection.post(path=path, weaviate_object=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+            results = response.json()
+        except Exception as error:
+            self._adapt(time.perf_counter() - start_time, failed=True)
+            return None, error
+        self._adapt(time.perf_counter() - start_time, failed=False)
+        return results, None
+
+    def _post_objects(self, items):
+        results, error = self._post("/batch/objects", {"fields": ["ALL"], "objects": [x for _, x in items]})
+        failed = []
+        for index, (attempt, weaviate_object) in enumerate(items):
+            item_errors = error or (results[index].get("result", {}).get("errors") if results else None)
+            if item_errors:
+                failed.append((attempt, weaviate_object, item_errors))
+            else:
+                with self._condition:
+                    self._stats(weaviate_object["class"])["stored"] += 1
+                    self._objects_done += 1
+
+        for attempt, weaviate_object, item_errors in failed:
+            self._retry_or_fail(self._objects, (attempt + 1, weaviate_object), weaviate_object["class"],
+                                attempt, item_errors)
+        self._print_live()
+
+    def _post_references(self, items):
+        results, error = self._post("/batch/references", [x for _, _, x in items])
+        for index, (attempt, class_name, reference) in enumerate(items):
+            item_errors = error or (results[index].get("result", {}).get("errors") if results else None)
+            if item_errors:
+                self._retry_or_fail(self._references, (attempt + 1, class_name, reference), class_name,
+                                    attempt, item_errors)
+            else:
+                with self._condition:
+                    self._stats(class_name)["references"] += 1
+                    self._references_done += 1
+        self._print_live()
+
+    def _retry_or_fail(self, queue, item, class_name, attempt, item_errors):
+        with self._condition:
+            self.errors += 1
+            if attempt < self.max_retries:
+                self._stats(class_name)["retried"] += 1
+                queue.append(item)  # sent again by the next flush
+            else:
+                self._stats(class_name)["failed"] += 1
+                print(f"\nGiving up on a {class_name} item after {attempt + 1} attempts: {item_errors}")
+
+    def _adapt(self, latency, failed):
+        with self._condition:
+            if failed or latency > self.target_latency:
+                # the server is struggling: smaller batches and fewer requests at the same time
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                self.concurrency = max(1, self.concurrency - 1)
+            elif latency < self.target_latency / 2:
+                if self.batch_size < self.max_batch_size:
+                    self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+                else:
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+        if failed:
+            time.sleep(self.target_latency / 2)  # give the server some room before the next request
+
+    def _rates(self):
+        elapsed_time = max(time.perf_counter() - self._start_time, 1e-9)
+        return self._objects_done / elapsed_time, self._references_done / elapsed_time
+
+    def _print_live(self):
+        now = time.perf_counter()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        objects_rate, references_rate = self._rates()
+        sys.stdout.write(f"\r[batch] {objects_rate:8.1f} objects/s {references_rate:8.1f} references/s  "
+                         f"size {self.batch_size:4d}  concurrency {self.concurrency}  errors {self.errors}")
+        sys.stdout.flush()
+
+    def print_report(self):
+        objects_rate, references_rate = self._rates()
+        print(f"\n[batch] {self._objects_done} objects ({objects_rate:.1f}/s), "
+              f"{self._references_done} references ({references_rate:.1f}/s), {self.errors} errors")
+        for class_name, stats in self.class_stats.items():
+            print(f"[batch]   {class_name}: {stats['stored']} objects, {stats['references']} references, "
+                  f"{stats['retried']} retried, {stats['failed']} failed")
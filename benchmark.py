@@ -0,0 +1,543 @@
+import ast
+import functools
+import json
+import os
+import random
+import re
+import resource
+import tempfile
+import time
+import wave
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import nltk
+import pandas as pd
+
+from summarization import summarizer_model_name, summarizer_engines, split_large_text_in_segments
+from batch_writer import AdaptiveBatchWriter
+from query_cache import bump_schema_version
+from util import ask_user_choice, column_converters, convert_literal_columns
+from weaviate_stub import WeaviateStub
+
+
+ted_talks_csv_path = "dataset/ted_talks_it.csv"
+ted_talks_audio_path = "dataset/AUDIO/"
+benchmark_results_dir = "cache/benchmarks/"
+audio_model_name = "facebook/wav2vec2-base-100k-voxpopuli"
+
+
+def legacy_split_large_text_in_segments(long_text, tokenizer):
+    # The original sentence-by-sentence chunker, kept here as the benchmark baseline
+    sentences = nltk.tokenize.sent_tokenize(long_text, language="italian")
+    length = 0
+    chunk = ""
+    chunks = []
+    count = -1
+    for sentence in sentences:
+        count += 1
+        combined_length = len(tokenizer.tokenize(sentence)) + length
+
+        if combined_length <= tokenizer.max_len_single_sentence:
+            chunk += sentence + " "
+            length = combined_length
+
+            if count == len(sentences) - 1:
+                chunks.append(chunk)
+
+        else:
+            chunks.append(chunk)
+            length = 0
+            chunk = ""
+
+            chunk += sentence + " "
+            length = len(tokenizer.tokenize(sentence))
+
+    return chunks
+
+
+def count_oversized_chunks(chunks, tokenizer):
+    return sum(1 for chunk in chunks if len(tokenizer.tokenize(chunk)) > tokenizer.max_len_single_sentence)
+
+
+def time_chunker(chunker, transcripts, tokenizer):
+    start_time = time.perf_counter()
+    all_chunks = [chunker(transcript, tokenizer) for transcript in transcripts]
+    elapsed_time = time.perf_counter() - start_time
+    return elapsed_time, all_chunks
+
+
+def benchmark_chunking():
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(summarizer_model_name, use_fast=True)
+    transcripts = list(pd.read_csv(ted_talks_csv_path).fillna(value="")["transcript"])
+    print(f"Chunking {len(transcripts)} transcripts...")
+
+    # warm up the punkt model and the tokenizer caches
+    split_large_text_in_segments(transcripts[0], tokenizer)
+    legacy_split_large_text_in_segments(transcripts[0], tokenizer)
+
+    legacy_time, legacy_chunks = time_chunker(legacy_split_large_text_in_segments, transcripts, tokenizer)
+    offset_time, offset_chunks = time_chunker(split_large_text_in_segments, transcripts, tokenizer)
+
+    for name, elapsed_time, all_chunks in [("legacy", legacy_time, legacy_chunks),
+                                           ("offsets", offset_time, offset_chunks)]:
+        chunks = [chunk for chunks in all_chunks for chunk in chunks]
+        empty_chunks = sum(1 for chunk in chunks if not chunk.strip())
+        oversized_chunks = count_oversized_chunks(chunks, tokenizer)
+        print(f"{name:>8}: {elapsed_time:8.2f}s  {len(chunks)} chunks  "
+              f"{empty_chunks} empty  {oversized_chunks} over the model window")
+
+    print(f"Speedup: {legacy_time / offset_time:.1f}x")
+
+
+def benchmark_audio_extraction(file_count=5, batch_size=4):
+    import librosa
+    import numpy as np
+    import torch
+    from audio_feature_extractor import AudioFeatureExtractor
+
+    audio_feature_extractor = AudioFeatureExtractor(audio_model_name, "cpu")
+    file_names = sorted(x for x in os.listdir(ted_talks_audio_path) if x.endswith(".mp3"))[:file_count]
+    file_paths = [os.path.join(ted_talks_audio_path, file_name) for file_name in file_names]
+    audio_seconds = sum(librosa.get_duration(path=file_path) for file_path in file_paths)
+    print(f"Embedding {len(file_paths)} files ({audio_seconds:.0f}s of audio) with {torch.get_num_threads()} threads")
+
+    results = {}
+    for name, extract in [("loop", audio_feature_extractor.extract_long_audio_embedding),
+                          ("batched", lambda file_path: audio_feature_extractor.extract_long_audio_embedding_batched(
+                              file_path, batch_size=batch_size)),
+                          ("pipeline", lambda file_path: audio_feature_extractor.extract_long_audio_embedding_pipelined(
+                              file_path, batch_size=batch_size))]:
+        start_time = time.perf_counter()
+        results[name] = [extract(file_path) for file_path in file_paths]
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{name:>8}: {elapsed_time:8.2f}s  {audio_seconds / elapsed_time:6.1f} audio s/s")
+
+    # stall and idle times of the last file, for both sides of the prefetch queue
+    stats = audio_feature_extractor.pipeline_stats
+    print(f"pipeline (last file): {stats['chunks']} chunks in {stats['batches']} batches, "
+          f"queue depth {stats['queue_depth']}")
+    print(f"    producer busy {stats['producer_busy']:.2f}s, stalled on a full queue {stats['producer_stall']:.2f}s")
+    print(f"    consumer busy {stats['consumer_busy']:.2f}s, idle on an empty queue {stats['consumer_idle']:.2f}s")
+    for file_name, loop_embedding, pipelined_embedding in zip(file_names, results["loop"], results["pipeline"]):
+        print(f"{file_name}: pipeline max abs difference {np.max(np.abs(loop_embedding - pipelined_embedding)):.2e}")
+
+    # the embeddings differ slightly because the batched path resamples the whole file at once
+    for file_name, loop_embedding, batched_embedding in zip(file_names, results["loop"], results["batched"]):
+        loop_embedding = np.ravel(loop_embedding)
+        batched_embedding = np.ravel(batched_embedding)
+        cosine = np.dot(loop_embedding, batched_embedding) / (
+                np.linalg.norm(loop_embedding) * np.linalg.norm(batched_embedding))
+        print(f"{file_name}: cosine similarity {cosine:.5f}")
+
+
+def legacy_dict_values_to_list_of_strings(dictionary_string):
+    if len(dictionary_string) == 0:
+        return []
+
+    dictionary = ast.literal_eval(dictionary_string)
+    result = []
+    for value in dictionary.values():
+        if isinstance(value, list):
+            result.extend(str(element) for element in value)
+        else:
+            result.append(str(value))
+    return result
+
+
+def legacy_dict_keys_to_list_of_strings(dictionary_string):
+    if len(dictionary_string) == 0:
+        return []
+
+    dictionary = ast.literal_eval(dictionary_string)
+    result = []
+    for key in dictionary.keys():
+        if isinstance(key, list):
+            result.extend(str(element) for element in key)
+        else:
+            result.append(str(key))
+    return result
+
+
+def legacy_list_string_to_python_list(list_string):
+    if len(list_string) == 0:
+        return []
+    else:
+        return ast.literal_eval(list_string)
+
+
+# The original literal_eval based converters, used as the reference output
+legacy_column_converters = {
+    "all_speakers": legacy_dict_values_to_list_of_strings,
+    "occupations": legacy_dict_values_to_list_of_strings,
+    "about_speakers": legacy_dict_values_to_list_of_strings,
+    "available_lang": legacy_list_string_to_python_list,
+    "topics": legacy_list_string_to_python_list,
+    "related_talks": legacy_dict_keys_to_list_of_strings,
+}
+
+
+def benchmark_column_conversion():
+    dataframe = pd.read_csv(ted_talks_csv_path).fillna(value="")
+    columns = list(column_converters.keys())
+    print(f"Converting {len(columns)} columns of {len(dataframe)} rows...")
+
+    start_time = time.perf_counter()
+    expected = {column: [legacy_column_converters[column](value) for value in dataframe[column]]
+                for column in columns}
+    legacy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    converted = convert_literal_columns(dataframe.copy())
+    fast_time = time.perf_counter() - start_time
+
+    # the fast converters must return exactly the same values, with the same types
+    mismatches = 0
+    for column in columns:
+        for row_index, (expected_value, converted_value) in enumerate(zip(expected[column], converted[column])):
+            if expected_value != converted_value or type(expected_value) is not type(converted_value):
+                mismatches += 1
+                print(f"Mismatch in {column}, row {row_index}: {expected_value!r} != {converted_value!r}")
+
+    print(f"literal_eval: {legacy_time:.3f}s, fast parser: {fast_time:.3f}s, speedup {legacy_time / fast_time:.1f}x")
+    print("Equivalence check " + ("passed" if mismatches == 0 else f"FAILED ({mismatches} mismatches)"))
+
+
+synthetic_words = ["idea", "futuro", "scienza", "persone", "mondo", "tempo", "energia", "clima", "città", "storia",
+                   "musica", "cervello", "dati", "acqua", "educazione", "salute", "tecnologia", "arte", "natura"]
+
+
+def generate_synthetic_csv(csv_path, talk_count, sentences_per_talk=200, seed=0):
+    rng = random.Random(seed)
+
+    def sentence():
+        return " ".join(rng.choice(synthetic_words) for _ in range(rng.randint(6, 20))).capitalize() + "."
+
+    rows = []
+    for talk_id in range(1, talk_count + 1):
+        # a few related talks point outside the dataset, like in the real one
+        related_ids = rng.sample(range(1, talk_count + 20), min(6, talk_count))
+        rows.append({
+            "talk_id": talk_id,
+            "title": sentence(),
+            "speaker_1": f"Speaker {talk_id}",
+            "all_speakers": repr({0: f"Speaker {talk_id}"}),
+            "occupations": repr({0: [rng.choice(synthetic_words), rng.choice(synthetic_words)]}),
+            "about_speakers": repr({0: sentence()}),
+            "views": rng.randint(1000, 10000000),
+            "recorded_date": "2020-01-01",
+            "published_date": "2020-02-01",
+            "event": f"TED{rng.randint(2000, 2020)}",
+            "native_lang": "en",
+            "available_lang": repr(["en", "it", rng.choice(["fr", "de", "es"])]),
+            "comments": rng.randint(0, 1000),
+            "duration": rng.randint(300, 1200),
+            "topics": repr(rng.sample(synthetic_words, 4)),
+            "related_talks": repr({related_id: sentence() for related_id in related_ids}),
+            "url": f"https://www.ted.com/talks/synthetic_{talk_id}",
+            "description": " ".join(sentence() for _ in range(3)),
+            "transcript": " ".join(sentence() for _ in range(sentences_per_talk))
+        })
+    pd.DataFrame(rows).to_csv(csv_path, index=False)
+
+
+def generate_synthetic_audio(audio_dir, talk_ids, seconds=5, sampling_rate=16000, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(audio_dir, exist_ok=True)
+    for talk_id in talk_ids:
+        samples = rng.normal(0, 0.1, seconds * sampling_rate)
+        samples = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+        # the content is WAV: the decoder detects the format from the header, not from the .mp3 extension
+        with wave.open(os.path.join(audio_dir, f"{talk_id}.mp3"), "wb") as audio_file:
+            audio_file.setnchannels(1)
+            audio_file.setsampwidth(2)
+            audio_file.setframerate(sampling_rate)
+            audio_file.writeframes(samples.tobytes())
+
+
+def timed_stage(results, name, function, items=None):
+    start_time = time.perf_counter()
+    value = function()
+    elapsed_time = time.perf_counter() - start_time
+    item_count = items(value) if items else None
+    results[name] = {"seconds": elapsed_time, "items": item_count,
+                     "items_per_second": item_count / elapsed_time if item_count and elapsed_time else None}
+    print(f"{name:>28}: {elapsed_time:8.3f}s" + (f"  {item_count} items" if item_count is not None else ""))
+    return value
+
+
+def benchmark_ingest(talk_count=500, include_audio=False, latency_per_object=0.0):
+    import weaviate
+    import system_init
+    from embedding_store import EmbeddingStore
+
+    work_dir = tempfile.mkdtemp(prefix="ted_ingest_benchmark_")
+    csv_path = os.path.join(work_dir, "ted_talks.csv")
+    audio_dir = os.path.join(work_dir, "AUDIO") + os.sep
+    print(f"Generating {talk_count} synthetic talks in {work_dir}...")
+    generate_synthetic_csv(csv_path, talk_count)
+    if include_audio:
+        generate_synthetic_audio(audio_dir, range(1, talk_count + 1))
+    system_init.ted_talks_audio_path = audio_dir
+    # create_schema bumps the schema version: the one of the real database must not change, or every cached query
+    # result of main.py would be thrown away by a benchmark run
+    system_init.bump_schema_version = functools.partial(bump_schema_version, os.path.join(work_dir, "schema_version"))
+
+    stages = {}
+    with WeaviateStub(latency_per_object=latency_per_object) as stub:
+        client = weaviate.Client(stub.url)
+        system_init.client = client
+        system_init.create_schema(system_init.ted_talk_object_schema)
+
+        id_to_uuid = {}
+        related_talks = {}
+        rows = timed_stage(stages, "csv_parse",
+                           lambda: list(system_init.iter_csv_rows(csv_path)), len)
+        talk_objects = timed_stage(stages, "prepare_objects",
+                                   lambda: list(system_init.prepare_objects(rows, id_to_uuid, related_talks)), len)
+
+        def store_ted_talks():
+            with AdaptiveBatchWriter(client) as batch:
+                system_init.store_ted_talks(batch, talk_objects, id_to_uuid)
+            return len(stub.objects)
+
+        def store_ted_talks_relations():
+            with AdaptiveBatchWriter(client) as batch:
+                system_init.store_ted_talks_relations(batch, related_talks, id_to_uuid)
+            return len(stub.references)
+
+        def store_talk_audio_embeddings():
+            store = EmbeddingStore(os.path.join(work_dir, "embeddings"))
+            with AdaptiveBatchWriter(client) as batch:
+                system_init.store_talk_audio_embeddings(batch, list(id_to_uuid), id_to_uuid, "cpu",
+                                                        system_init.audio_embedding_workers, store)
+            return len(store)
+
+        timed_stage(stages, "store_ted_talks", store_ted_talks, lambda count: count)
+        timed_stage(stages, "store_ted_talks_relations", store_ted_talks_relations, lambda count: count)
+        if include_audio:
+            timed_stage(stages, "store_talk_audio_embeddings", store_talk_audio_embeddings, lambda count: count)
+
+        request_counts = dict(stub.request_counts)
+
+    os.makedirs(benchmark_results_dir, exist_ok=True)
+    results_path = os.path.join(benchmark_results_dir, f"ingest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(results_path, "w", encoding="utf-8") as results_file:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "talk_count": talk_count,
+            "include_audio": include_audio,
+            "latency_per_object": latency_per_object,
+            "stages": stages,
+            "requests": request_counts
+        }, results_file, indent=2)
+    print(f"Results written to {results_path}")
+
+
+def benchmark_query_projection(concepts=("clima", "educazione", "musica", "cervello", "futuro"), limit=3):
+    import weaviate
+    import main
+
+    client = weaviate.Client("http://localhost:8080")
+    main.load_schema_settings(client)
+
+    def run(properties, lazy_transcripts):
+        payload_bytes = 0
+        start_time = time.perf_counter()
+        for concept in concepts:
+            query = main.build_query(client, limit=limit, properties=properties)
+            response = query.with_near_text({"concepts": [concept]}).do()
+            payload_bytes += len(json.dumps(response))
+            if lazy_transcripts:
+                talks = response["data"]["Get"]["TedTalk"]
+                transcript_query = client.query.get("TedTalk", ["transcript"]).with_additional(["id"])
+                for talk in talks:
+                    if not talk.get("summary"):
+                        talk_filter = {"path": ["id"], "operator": "Equal", "valueText": talk["_additional"]["id"]}
+                        payload_bytes += len(json.dumps(transcript_query.with_where(talk_filter).do()))
+        return payload_bytes / len(concepts), (time.perf_counter() - start_time) / len(concepts)
+
+    full_bytes, full_latency = run(main.parameters, lazy_transcripts=False)
+    projected_bytes, projected_latency = run(main.result_parameters, lazy_transcripts=True)
+    print(f"    all fields: {full_bytes / 1024:8.1f} KB/query  {full_latency * 1000:7.1f} ms/query")
+    print(f"    projection: {projected_bytes / 1024:8.1f} KB/query  {projected_latency * 1000:7.1f} ms/query"
+          f"  (transcripts fetched only for talks without a summary)")
+
+
+def benchmark_audio_index(query_count=20, limit=3, seed=0):
+    import numpy as np
+    import weaviate
+    import main
+
+    client = weaviate.Client("http://localhost:8080")
+    main.load_schema_settings(client)
+    main.audio_index = main.AudioIndex()
+
+    start_time = time.perf_counter()
+    main.audio_index.sync(client)
+    print(f"Synced {len(main.audio_index)} audio vectors in {time.perf_counter() - start_time:.2f}s "
+          f"(metric: {main.similarity_metric})")
+    if len(main.audio_index) == 0:
+        return
+
+    # the queries are stored vectors with some noise, like a clip cut from a talk
+    random_generator = np.random.default_rng(seed)
+    rows = random_generator.choice(len(main.audio_index), size=min(query_count, len(main.audio_index)), replace=False)
+    vectors = main.audio_index.vectors * main.audio_index.norms[:, None]
+    dimension = vectors.shape[1]
+    queries = [vectors[row] + random_generator.normal(scale=0.05 * main.audio_index.norms[row] / np.sqrt(dimension),
+                                                      size=dimension).astype(np.float32) for row in rows]
+
+    results = {}
+    for name, use_local_index in [("weaviate", False), ("local", True)]:
+        start_time = time.perf_counter()
+        results[name] = [main.audio_search_results(client, query.tolist(), limit, use_local_index=use_local_index)
+                         for query in queries]
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{name:>9}: {elapsed_time / len(queries) * 1000:8.2f} ms/query")
+
+    # HNSW is approximate, the local index is exact: the overlap tells how much the results differ
+    overlaps = [len({talk["talk_id"] for talk in weaviate_talks} & {talk["talk_id"] for talk in local_talks}) /
+                max(1, len(local_talks)) for weaviate_talks, local_talks in zip(results["weaviate"], results["local"])]
+    print(f"Top-{limit} overlap: {sum(overlaps) / len(overlaps):.1%}")
+
+
+def benchmark_qna_passages(questions=("Che cos'è il cambiamento climatico?", "Come funziona il cervello?",
+                                       "Perché la musica ci emoziona?", "Come cambierà la scuola?"), limit=3):
+    import weaviate
+    import main
+
+    client = weaviate.Client("http://localhost:8080")
+    main.load_schema_settings(client)
+    if not main.passage_qna:
+        print("No transcript passages in the database: run system_init first")
+        return
+
+    for name, use_passages in [("transcripts", False), ("passages", True)]:
+        answered = 0
+        start_time = time.perf_counter()
+        for question in questions:
+            results = main.question_and_answer_results(client, question, limit, use_passages=use_passages)
+            answered += sum(1 for result in results if result["_additional"]["answer"].get("hasAnswer"))
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{name:>12}: {elapsed_time / len(questions) * 1000:8.1f} ms/question  "
+              f"{answered} answers out of {len(questions) * limit} results")
+
+
+def rouge_tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def rouge_f1(reference_units, candidate_units):
+    overlap = sum((Counter(reference_units) & Counter(candidate_units)).values())
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(candidate_units)
+    recall = overlap / len(reference_units)
+    return 2 * precision * recall / (precision + recall)
+
+
+def longest_common_subsequence(first, second):
+    previous = [0] * (len(second) + 1)
+    for first_token in first:
+        current = [0]
+        for index, second_token in enumerate(second):
+            if first_token == second_token:
+                current.append(previous[index] + 1)
+            else:
+                current.append(max(previous[index + 1], current[-1]))
+        previous = current
+    return previous[-1]
+
+
+def rouge_scores(reference, candidate):
+    # ROUGE-1, ROUGE-2 and ROUGE-L F1, computed on lowercase word tokens
+    reference_tokens = rouge_tokens(reference)
+    candidate_tokens = rouge_tokens(candidate)
+    if not reference_tokens or not candidate_tokens:
+        return {"rouge1": 0.0, "rouge2": 0.0, "rougeL": 0.0}
+
+    lcs = longest_common_subsequence(reference_tokens, candidate_tokens)
+    precision = lcs / len(candidate_tokens)
+    recall = lcs / len(reference_tokens)
+    return {
+        "rouge1": rouge_f1(reference_tokens, candidate_tokens),
+        "rouge2": rouge_f1(list(zip(reference_tokens, reference_tokens[1:])),
+                           list(zip(candidate_tokens, candidate_tokens[1:]))),
+        "rougeL": 2 * precision * recall / (precision + recall) if lcs else 0.0
+    }
+
+
+def run_summarizer_engine(engine, transcripts):
+    # Runs in its own process, so that the peak memory belongs to this engine only
+    from summarization import create_summarizer, engine_parameters, summarize
+
+    start_time = time.perf_counter()
+    summarizer = create_summarizer("cpu", engine=engine)
+    load_time = time.perf_counter() - start_time
+
+    summaries = []
+    latencies = []
+    for transcript in transcripts:
+        start_time = time.perf_counter()
+        summaries.append(summarize(summarizer, transcript, engine_parameters(engine)))
+        latencies.append(time.perf_counter() - start_time)
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kilobytes on Linux
+    return {"load_time": load_time, "latencies": latencies, "peak_rss_mb": peak_rss_kb / 1024, "summaries": summaries}
+
+
+def benchmark_summarizer_engines(transcript_count=5):
+    # The reference summaries are the ones of the default engine, i.e. the current summarize output
+    dataframe = pd.read_csv(ted_talks_csv_path, usecols=["talk_id", "transcript"]).fillna(value="")
+    dataframe = dataframe[dataframe["transcript"].str.len() > 0].sort_values("talk_id").head(transcript_count)
+    transcripts = list(dataframe["transcript"])
+    print(f"Summarizing {len(transcripts)} transcripts with every engine...")
+
+    runs = {}
+    for engine in summarizer_engines:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            runs[engine] = executor.submit(run_summarizer_engine, engine, transcripts).result()
+
+    references = runs["default"]["summaries"]
+    print(f"{'engine':>12} {'load':>8} {'latency':>9} {'peak RSS':>10} {'ROUGE-1':>8} {'ROUGE-2':>8} {'ROUGE-L':>8}")
+    for engine, run in runs.items():
+        scores = [rouge_scores(reference, summary) for reference, summary in zip(references, run["summaries"])]
+        run["rouge"] = {name: sum(score[name] for score in scores) / len(scores) for name in scores[0]}
+        mean_latency = sum(run["latencies"]) / len(run["latencies"])
+        print(f"{engine:>12} {run['load_time']:7.1f}s {mean_latency:8.2f}s {run['peak_rss_mb']:7.0f} MB "
+              f"{run['rouge']['rouge1']:8.3f} {run['rouge']['rouge2']:8.3f} {run['rouge']['rougeL']:8.3f}")
+
+    os.makedirs(benchmark_results_dir, exist_ok=True)
+    results_path = os.path.join(benchmark_results_dir, f"summarizer-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(results_path, "w", encoding="utf-8") as results_file:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "talk_ids": [int(talk_id) for talk_id in dataframe["talk_id"]],
+            "engines": runs
+        }, results_file, indent=2, ensure_ascii=False)
+    print(f"Results written to {results_path}")
+
+
+benchmarks = {
+    "Chunking dei transcript": benchmark_chunking,
+    "Estrazione delle feature audio": benchmark_audio_extraction,
+    "Conversione delle colonne del CSV": benchmark_column_conversion,
+    "Ingest su Weaviate locale simulato": benchmark_ingest,
+    "Proiezione dei campi nelle query": benchmark_query_projection,
+    "Indice audio locale contro Weaviate": benchmark_audio_index,
+    "Q&A su passaggi contro transcript interi": benchmark_qna_passages,
+    "Motori di riassunto (latenza, memoria, ROUGE)": benchmark_summarizer_engines,
+}
+
+
+if __name__ == '__main__':
+    names = list(benchmarks.keys())
+    index, _ = ask_user_choice("Quale benchmark eseguire?", names)
+    benchmarks[names[index]]()
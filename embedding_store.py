@@ -0,0 +1,111 @@
+import fcntl
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+audio_embedding_store_dir = "cache/audio_embeddings/"
+
+
+class EmbeddingStore:
+    """
+        Append-only store of float32 embeddings. Vectors are appended to a raw matrix file that is read through a
+        memory map, while the index file maps every key (content hash + model name) to its row in the matrix.
+    """
+    store_dir = None
+    dimension = None
+    rows = None
+
+    def __init__(self, store_dir=audio_embedding_store_dir, dimension=512):
+        self.store_dir = store_dir
+        self.dimension = dimension
+        self.rows = {}
+        self._matrix = None
+        self._row_count = 0
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.store_dir, "vectors.f32")
+        self._index_path = os.path.join(self.store_dir, "index.jsonl")
+        self._load()
+
+    @staticmethod
+    def file_key(file_path, model_name):
+        content_hash = hashlib.sha1()
+        with open(file_path, "rb") as content:
+            for block in iter(lambda: content.read(1024 * 1024), b""):
+                content_hash.update(block)
+        return f"{content_hash.hexdigest()}:{model_name}"
+
+    def _row_bytes(self):
+        return self.dimension * np.dtype(np.float32).itemsize
+
+    def _load(self):
+        # "ab" creates the file without truncating one that another process has just created
+        with open(self._vectors_path, "ab") as vectors_file:
+            # the shared lock waits for an append in progress, so that the rows and the index are read consistently.
+            # A partial row left by a crash is not counted here, and the next add drops it while holding the lock
+            fcntl.flock(vectors_file.fileno(), fcntl.LOCK_SH)
+            try:
+                self._row_count = vectors_file.seek(0, os.SEEK_END) // self._row_bytes()
+
+                if os.path.exists(self._index_path):
+                    with open(self._index_path, "r", encoding="utf-8") as index_file:
+                        for line in index_file:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # a partially written line
+                            if entry["row"] < self._row_count:
+                                self.rows[entry["key"]] = entry["row"]
+            finally:
+                fcntl.flock(vectors_file.fileno(), fcntl.LOCK_UN)
+
+    def _get_matrix(self):
+        # the memory map is reopened only when rows were appended after it was created
+        if self._matrix is None or self._matrix.shape[0] != self._row_count:
+            if self._row_count == 0:
+                return None
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                     shape=(self._row_count, self.dimension))
+        return self._matrix
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return np.array(self._get_matrix()[row])
+
+    def add(self, key, vector, item_id=None):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimension:
+            raise ValueError(f"Expected a vector of {self.dimension} elements, got {vector.shape[0]}")
+
+        with open(self._vectors_path, "ab") as vectors_file:
+            # other processes (main.py, system_init) may append to the same store: the row is the real end of the
+            # file, read while holding the lock
+            fcntl.flock(vectors_file.fileno(), fcntl.LOCK_EX)
+            try:
+                end = vectors_file.seek(0, os.SEEK_END)
+                row = end // self._row_bytes()
+                if end % self._row_bytes():
+                    os.ftruncate(vectors_file.fileno(), row * self._row_bytes())  # partial row left by a crash
+
+                # the vector is written before its index entry, so the index never points to missing data
+                vectors_file.write(vector.tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+                with open(self._index_path, "a", encoding="utf-8") as index_file:
+                    index_file.write(json.dumps({"key": key, "id": item_id, "row": row}) + "\n")
+            finally:
+                fcntl.flock(vectors_file.fileno(), fcntl.LOCK_UN)
+
+        self._row_count = max(self._row_count, row + 1)
+        self.rows[key] = row
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+
+
+manifest_path = "cache/ingest_manifest.json"
+
+
+def load_manifest(path=manifest_path):
+    """
+        Loads the manifest written by the last ingest: for every talk id (as a string) it records the content hash
+        and uuid of the TedTalk object, whether it was stored with a summary and, when the talk has an mp3, the
+        audio fingerprint, embedding key and uuid
+    :return: the manifest, or None if no ingest has been recorded yet
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest, path=manifest_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temporary_path, path)
+
+
+def delete_manifest(path=manifest_path):
+    # Called before the data is rebuilt from scratch: an interrupted rebuild must not leave behind a manifest that
+    # describes objects which no longer exist
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def talk_content_hash(talk_object, related_talks_ids):
+    content = json.dumps([talk_object, list(related_talks_ids)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def audio_fingerprint(file_path):
+    # cheap change detection: the content is only hashed again when size or modification time change
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
@@ -1,49 +1,147 @@
+import copy
+import hashlib
 import os.path
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+
+boot_time = time.perf_counter()  # time to menu and time to first result are measured from here
+
+# transformers, torch and nltk are imported only where they are needed: together they take seconds to import
+import numpy as np
 import weaviate
-import nltk
-from transformers import pipeline
 import ssl
 
 
-from audio_feature_extractor import AudioFeatureExtractor
+from audio_index import AudioIndex, supported_metrics
+from embedding_store import EmbeddingStore
+from query_cache import QueryCache
+from summarization import summarizer_cache_name, summarizer_parameters, summarize_many, \
+    summarize_chunks, split_large_text_in_segments, ensure_punkt, create_summarizer
+from summary_cache import SummaryCache
+import tracing
 from util import ask_user_choice, prettify_duration
 
 
-summarizer_model_name = "facebook/bart-large-cnn"
 audio_model_name = "facebook/wav2vec2-base-100k-voxpopuli"
 summarizer = None
 audio_feature_extractor = None
-
-# Which parameters we want in output
+audio_embedding_store = None
+audio_index = None
+audio_index_lock = threading.Lock()  # the batch runner searches from several threads
+
+# Progressive audio search: the query audio is embedded block by block and the search stops early when the top-k
+# talks have not changed for progressive_stable_blocks blocks, or when progressive_time_budget seconds have passed
+progressive_block_seconds = 60  # the chunks of extract_long_audio_embedding: a full run gives the same embedding
+progressive_stable_blocks = 2
+progressive_time_budget = 60.0
+summary_cache = None
+query_cache = None
+similarity_metric = None  # read from the schema, it is part of the query cache key
+passage_qna = False  # True when system_init stored the transcript passages, Q&A then runs over them
+summarizer_loader = None
+summarizer_loader_lock = threading.Lock()
+prefetch_tokenizer = None
+first_result_reported = False
+
+# Every parameter of a TedTalk
 parameters = ["talk_id", "title", "speaker_1", "all_speakers", "occupations", "about_speakers", "views",
               "recorded_date", "published_date", "event", "native_lang", "available_lang", "comments",
-              "duration", "topics", "url", "description", "transcript"]  # "related_talks"
+              "duration", "topics", "url", "description", "transcript", "summary"]  # "related_talks"
+
+# Which parameters we want in output for each mode. The transcript is never part of them: it is fetched later,
+# only for the talks that still need a summary (see fetch_missing_transcripts)
+result_parameters = ["talk_id", "title", "speaker_1", "event", "native_lang", "duration", "description", "url",
+                     "summary"]
+qna_parameters = ["talk_id", "title"]
+qna_passage_parameters = ["talk_id", "start_offset", "end_offset", "talk_entry { ... on TedTalk { title } }"]
+
+
+def load_schema_settings(client: weaviate.Client):
+    global similarity_metric, passage_qna
+
+    passage_qna = any(x["class"] == "TedTalkPassage" for x in client.schema.get()["classes"])
+
+    talk_schema = client.schema.get("TedTalk")
+    similarity_metric = talk_schema.get("vectorIndexConfig", {}).get("distance")
+
+    # databases configured before summaries were precomputed do not have the summary property
+    talk_properties = [x["name"] for x in talk_schema["properties"]]
+    if "summary" not in talk_properties and "summary" in parameters:
+        parameters.remove("summary")
+        result_parameters.remove("summary")
+
 
-def build_query(client: weaviate.Client, limit=3, additional_parameters=None):
+def cached_results(mode, text, limit, additional_parameters, run_query):
+    # Answers repeated searches from the query cache instead of going through execute_query again
+    if query_cache is None:
+        return run_query()
+
+    key = QueryCache.build_key(mode, text, limit, additional_parameters, similarity_metric)
+    return query_cache.get_or_compute(key, run_query)
+
+
+@tracing.traced("build_query")
+def build_query(client: weaviate.Client, limit=3, additional_parameters=None, properties=None):
     # Which class to look for on the database
     class_name = "TedTalk"
 
     if additional_parameters is None:
         additional_parameters = ["id", "certainty", "distance"]
 
+    if properties is None:
+        properties = result_parameters
+
     # Performs the query
     query = client.query\
-        .get(class_name, parameters)\
+        .get(class_name, properties)\
         .with_limit(limit)\
         .with_additional(additional_parameters)
 
     return query
 
 
-def execute_query(query):
-    query = query.do()
+def uuid_filter(uuids):
+    conditions = [{"path": ["id"], "operator": "Equal", "valueText": uuid} for uuid in uuids]
+    return conditions[0] if len(conditions) == 1 else {"operator": "Or", "operands": conditions}
+
 
-    ted_talks = query["data"]["Get"]["TedTalk"]  # navigate the response json and only return the talks
+def fetch_missing_transcripts(client: weaviate.Client, talks):
+    # Second, lazy fetch: only the talks without a precomputed summary need their transcript
+    talks_by_uuid = {talk["_additional"]["id"]: talk for talk in talks
+                     if not talk.get("summary") and "transcript" not in talk}
+    if not talks_by_uuid:
+        return
+
+    query = client.query\
+        .get("TedTalk", ["transcript"])\
+        .with_where(uuid_filter(talks_by_uuid))\
+        .with_limit(len(talks_by_uuid))\
+        .with_additional(["id"])
+
+    for result in execute_query(query):
+        talks_by_uuid[result["_additional"]["id"]]["transcript"] = result["transcript"]
+
+
+def execute_query(query, class_name="TedTalk"):
+    if tracing.enabled:
+        # same request as query.do(), split in two spans to tell the network time from the JSON decode
+        with tracing.span("execute_query", class_name=class_name):
+            with tracing.span("execute_query.network"):
+                response = query._connection.post(path="/graphql", weaviate_object={"query": query.build()})
+            if response.status_code != 200:
+                raise RuntimeError(f"GraphQL query returned {response.status_code}: {response.text[:200]}")
+            with tracing.span("execute_query.json_decode"):
+                query = response.json()
+    else:
+        query = query.do()
+
+    ted_talks = query["data"]["Get"][class_name]  # navigate the response json and only return the talks
     return ted_talks
 
 
-def print_result(talk):
+def print_result(talk, summary):
     print("============================================")
     print(f" # Talk id: {talk['talk_id']}")
     print(f" # Title: {talk['title']}")
@@ -52,83 +150,157 @@ def print_result(talk):
     print(f" # Duration: {prettify_duration(talk['duration'])}")
     print(f" # Description: {talk['description']}")
     print(f" # URL: {talk['url']}")
-    print(" # TLDR: ", end="", flush=True)
-    summary = summarize(summarizer, talk['transcript'])
-    print(summary)
+    print(f" # TLDR: {summary}")
     print("")
 
 
-def split_large_text_in_segments(long_text, tokenizer):
-    # https://discuss.huggingface.co/t/summarization-on-long-documents/920/24
-    sentences = nltk.tokenize.sent_tokenize(long_text, language="italian")
-    length = 0
-    chunk = ""
-    chunks = []
-    count = -1
-    for sentence in sentences:
-        count += 1
-        combined_length = len(tokenizer.tokenize(sentence)) + length  # add the # of sentence tokens to the length counter
-
-        if combined_length <= tokenizer.max_len_single_sentence:  # if it doesn't exceed
-            chunk += sentence + " "  # add the sentence to the chunk
-            length = combined_length  # update the length counter
-
-            # if it is the last sentence
-            if count == len(sentences) - 1:
-                chunks.append(chunk)  # save the chunk
-
-        else:
-            chunks.append(chunk)  # save the chunk
-            # reset
-            length = 0
-            chunk = ""
-
-            # take care of the overflow sentence
-            chunk += sentence + " "
-            length = len(tokenizer.tokenize(sentence))
-
-    return chunks
-
-
-def summarize(summarizer, long_text):
-    # Since this summarizer can't handle texts longer than 1024 characters, we need to split the input text in
-    # sentences shorter than 1024. We summarize each sentence and then we join the summarized results
+def prepare_summary(client, talk):
+    # First half of a talk's summarization: transcript fetch, cache lookup and tokenization. It runs on the prefetch
+    # thread while the summarizer generates the previous talk's summary. Returns (summary, None) when the summary
+    # is already known, (None, chunks) otherwise
+    global prefetch_tokenizer
+
+    if talk.get('summary'):
+        return talk['summary'], None
+
+    fetch_missing_transcripts(client, [talk])
+    if summary_cache is not None:
+        key = SummaryCache.build_key(talk['talk_id'], talk['transcript'], summarizer_cache_name, summarizer_parameters)
+        summary = summary_cache.get(key)
+        if summary is not None:
+            return summary, None
+
+    # a fast tokenizer must not be used by two threads at once: the prefetch thread has its own copy
+    if prefetch_tokenizer is None:
+        prefetch_tokenizer = copy.deepcopy(get_summarizer().tokenizer)
+    return None, split_large_text_in_segments(talk['transcript'], prefetch_tokenizer)
+
+
+def print_results_pipelined(client, talks, start_time):
+    # Prints every talk as soon as its summary is ready, while the next talk is prepared in the background
+    model = get_summarizer()
+    first_result_time = None
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        next_preparation = prefetch.submit(prepare_summary, client, talks[0]) if talks else None
+        for index, talk in enumerate(talks):
+            summary, chunks = next_preparation.result()
+            if index + 1 < len(talks):
+                next_preparation = prefetch.submit(prepare_summary, client, talks[index + 1])
+
+            if summary is None:
+                summary = summarize_chunks(model, chunks)
+                if summary_cache is not None:
+                    summary_cache.put(SummaryCache.build_key(talk['talk_id'], talk['transcript'],
+                                                             summarizer_cache_name, summarizer_parameters), summary)
+
+            print_result(talk, summary)
+            if first_result_time is None:
+                first_result_time = time.perf_counter() - start_time
+                report_time_to_first_result()
+
+    total_time = time.perf_counter() - start_time
+    if first_result_time is not None:
+        print(f"(primo risultato in {first_result_time:.2f}s, {len(talks)} risultati in {total_time:.2f}s)")
+
+
+def load_summarizer(device):
+    # Runs on a background thread, so the menu is ready at once. The first generation is much slower than the
+    # following ones: a tiny one is run here too, before any talk needs a summary
+    global summarizer
+
+    ensure_punkt()
+    model = create_summarizer(device)
+    model("Warm up.", **dict(summarizer_parameters, max_length=8))
+    summarizer = model
+
+
+def start_summarizer_loading(device):
+    global summarizer_loader
+
+    with summarizer_loader_lock:
+        if summarizer_loader is None and summarizer is None:
+            summarizer_loader = threading.Thread(target=load_summarizer, args=(device,), daemon=True)
+            summarizer_loader.start()
+
+
+def get_summarizer(device="cpu"):
+    # Waits for the background loading, starting it if nobody did yet
+    if summarizer is None:
+        start_summarizer_loading(device)
+        summarizer_loader.join()
+        if summarizer is None:
+            raise RuntimeError("The summarizer model could not be loaded")
+    return summarizer
+
+
+def report_time_to_first_result():
+    global first_result_reported
+
+    if not first_result_reported:
+        first_result_reported = True
+        print(f"(primo risultato dall'avvio in {time.perf_counter() - boot_time:.2f}s)")
+
+
+def cached_summarize_many(talks):
+    summaries = [talk.get('summary') or None for talk in talks]
+    if all(summaries):
+        return summaries
+
+    if summary_cache is None:
+        missing = [index for index, summary in enumerate(summaries) if summary is None]
+        generated = summarize_many(get_summarizer(), [talks[index]['transcript'] for index in missing])
+        for index, summary in zip(missing, generated):
+            summaries[index] = summary
+        return summaries
+
+    # only the talks without a stored summary have a transcript, see fetch_missing_transcripts
+    keys = {
+        index: SummaryCache.build_key(talks[index]['talk_id'], talks[index]['transcript'], summarizer_cache_name,
+                                      summarizer_parameters)
+        for index, summary in enumerate(summaries) if summary is None
+    }
+    for index, key in keys.items():
+        summaries[index] = summary_cache.get(key)
 
-    tokenizer = summarizer.tokenizer
-    text_chunks = split_large_text_in_segments(long_text, tokenizer)
+    # only the talks missing from the cache go through the summarizer
+    missing = [index for index, summary in enumerate(summaries) if summary is None]
+    if missing:
+        generated = summarize_many(get_summarizer(), [talks[index]['transcript'] for index in missing])
+        for index, summary in zip(missing, generated):
+            summary_cache.put(keys[index], summary)
+            summaries[index] = summary
 
-    # Performs summarization
-    summaries = summarizer(text_chunks, length_penalty=5.0, num_beams=4, max_length=256, early_stopping=True, do_sample=False)
+    return summaries
 
-    # Joins the results to get a single text
-    summary = ""
-    for r in summaries:
-        summary += r["summary_text"] + " "
 
-    # Returns the summary
-    return summary
+def semantic_search_results(client, text, limit=3):
+    query = build_query(client, limit=limit)
+    query = query.with_near_text({
+        "concepts": [text]  # Search using a near_text technique
+    })
+    return cached_results("semantic", text, limit, result_parameters, lambda: execute_query(query))
 
 
 def semantic_search(client):
     text = input("> Cosa cerchi? ")
-    query = build_query(client, limit=3)
-    query = query.with_near_text({
-        "concepts": [text]  # Search using a near_text technique
-    })
-    results = execute_query(query)
+    start_time = time.perf_counter()
+    results = semantic_search_results(client, text)
     print("Ecco cosa ho trovato:")
-    for talk in results:
-        print_result(talk)
+    print_results_pipelined(client, results, start_time)
+
+
+def hybrid_search_results(client, text, limit=3):
+    query = build_query(client, limit=limit)
+    query = query.with_hybrid(query=text, properties=["transcript"]) #perform hybrid search on transcript only
+    return cached_results("hybrid", text, limit, result_parameters, lambda: execute_query(query))
 
 
 def hybrid_search(client):
     text = input("> Cosa cerchi? ")
-    query = build_query(client, limit=3)
-    query = query.with_hybrid(query=text, properties=["transcript"]) #perform hybrid search on transcript only
-    results = execute_query(query)
+    start_time = time.perf_counter()
+    results = hybrid_search_results(client, text)
     print("Ecco cosa ho trovato:")
-    for talk in results:
-        print_result(talk)
+    print_results_pipelined(client, results, start_time)
 
 
 def print_qna_result_text(transcript: str, answer: str, answer_start: int, answer_end: int) -> None:
@@ -161,7 +333,8 @@ def print_qna_result(query_result):
 
         talk_id = query_result['talk_id']
         talk_title = query_result['title']
-        talk_transcript = query_result['transcript']
+        talk_transcript = query_result.get('transcript', "")  # not fetched by question_and_answer
+        # the positions are offsets into the whole transcript, also when the answer was found in a passage
 
         print(f"# Risposta: {answer_text}")
         print(f"# Certezza: {certainty}")
@@ -170,18 +343,63 @@ def print_qna_result(query_result):
         print("")
 
 
-def question_and_answer(client):
-    user_provided_question = input("> Fai una domanda: ")
-
+def passage_answers(passages, limit):
+    # Keeps the best passage of every talk and shapes it like a result of the talk level Q&A. The answer positions
+    # are moved from the passage to the whole transcript
+    results = {}
+    for passage in passages:
+        if passage["talk_id"] in results:
+            continue
+
+        answer = dict(passage["_additional"]["answer"])
+        if answer.get("hasAnswer"):
+            answer["startPosition"] += passage["start_offset"]
+            answer["endPosition"] += passage["start_offset"]
+        talk_entry = passage.get("talk_entry") or [{}]
+        results[passage["talk_id"]] = {
+            "talk_id": passage["talk_id"],
+            "title": talk_entry[0].get("title", ""),
+            "_additional": {"answer": answer}
+        }
+        if len(results) == limit:
+            break
+    return list(results.values())
+
+
+def question_and_answer_results(client, question, limit=3, use_passages=None):
     additional_parameters = "answer {hasAnswer certainty property result startPosition endPosition}"
+    if use_passages is None:
+        use_passages = passage_qna
+
+    if use_passages:
+        # the Q&A model reads short passages instead of whole transcripts, the best answers come first
+        ask_details = {
+            "question": question,
+            "properties": ["text"],
+            "rerank": True
+        }
+        query = client.query\
+            .get("TedTalkPassage", qna_passage_parameters)\
+            .with_ask(ask_details)\
+            .with_limit(limit * 3)\
+            .with_additional(additional_parameters)
+        return cached_results("qna-passages", question, limit, additional_parameters,
+                              lambda: passage_answers(execute_query(query, "TedTalkPassage"), limit))
+
     ask_details = {
-        "question": user_provided_question,
+        "question": question,
         "properties": ["transcript"]
     }
 
-    query = build_query(client, limit=3, additional_parameters=additional_parameters)
+    query = build_query(client, limit=limit, additional_parameters=additional_parameters, properties=qna_parameters)
     query = query.with_ask(ask_details)  # perform hybrid search on transcript only
-    results = execute_query(query)
+    return cached_results("qna", question, limit, additional_parameters, lambda: execute_query(query))
+
+
+def question_and_answer(client):
+    user_provided_question = input("> Fai una domanda: ")
+    start_time = time.perf_counter()
+    results = question_and_answer_results(client, user_provided_question)
 
     if results:
         answer_found = any([
@@ -192,50 +410,185 @@ def question_and_answer(client):
             print("Ecco cosa ho trovato:")
             for result in results:
                 print_qna_result(result)
+            report_time_to_first_result()
+            print(f"({len(results)} risultati in {time.perf_counter() - start_time:.2f}s)")
         else:
             print("Non ho trovato risposte")
     else:
         print("Risultati non disponibili")
 
 
-def audio_search(client, device):
+def get_audio_feature_extractor(device):
     global audio_feature_extractor
 
     if audio_feature_extractor is None:
+        from audio_feature_extractor import AudioFeatureExtractor  # imports torch and transformers
+
         print("Initializing audio model...")
         audio_feature_extractor = AudioFeatureExtractor(audio_model_name, device)
+    return audio_feature_extractor
+
+
+def get_stored_audio_embedding(audio_file_path):
+    # repeated query clips and dataset files are never embedded twice
+    global audio_embedding_store
+
+    if audio_embedding_store is None:
+        audio_embedding_store = EmbeddingStore()
+
+    key = EmbeddingStore.file_key(audio_file_path, audio_model_name)
+    return key, audio_embedding_store.get(key)
+
+
+def get_audio_embedding(audio_file_path, device):
+    key, audio_features = get_stored_audio_embedding(audio_file_path)
+    if audio_features is not None:
+        return audio_features
 
+    extractor = get_audio_feature_extractor(device)
+    print("Extracting audio features...")
+    audio_features = extractor.extract_long_audio_embedding_pipelined(audio_file_path)
+    audio_embedding_store.add(key, audio_features, item_id=os.path.basename(audio_file_path))
+    return audio_features
+
+
+def progressive_audio_search_results(client, audio_file_path, device, limit=3):
+    """
+        Queries the database with the running mean of the blocks embedded so far, after every block
+    :return: (talks, embedding, seconds of audio processed, True if the whole file was processed)
+    """
+    extractor = get_audio_feature_extractor(device)
+    start_time = time.perf_counter()
+
+    embedding_sum = None
+    blocks = 0
+    processed_seconds = 0.0
+    talks = []
+    previous_talk_ids = None
+    unchanged_blocks = 0
+    complete = True
+
+    chunk_embeddings = extractor.iter_chunk_embeddings(audio_file_path, progressive_block_seconds)
+    for chunk_features, chunk_seconds in chunk_embeddings:
+        embedding_sum = chunk_features if embedding_sum is None else embedding_sum + chunk_features
+        blocks += 1
+        processed_seconds += chunk_seconds
+        talks = audio_search_results(client, embedding_sum / blocks, limit)
+
+        talk_ids = {talk["talk_id"] for talk in talks}
+        unchanged_blocks = unchanged_blocks + 1 if talk_ids == previous_talk_ids else 0
+        previous_talk_ids = talk_ids
+        print(f"\rBlock {blocks}: {processed_seconds:.0f}s of audio, "
+              f"top-{limit} unchanged for {unchanged_blocks} blocks", end="", flush=True)
+
+        if unchanged_blocks >= progressive_stable_blocks \
+                or time.perf_counter() - start_time > progressive_time_budget:
+            # every block but the last one holds exactly progressive_block_seconds of audio: a shorter block means
+            # the file ended with it, and the embedding is the full-file one even though the search stops here.
+            # A file that ends exactly on a block boundary is counted as incomplete, its embedding is not stored
+            complete = chunk_seconds < progressive_block_seconds
+            break
+    chunk_embeddings.close()
+    print("")
+
+    embedding = embedding_sum / blocks if blocks else None
+    return talks, embedding, processed_seconds, complete
+
+
+def local_audio_search(client, audio_features, limit):
+    # Exact top-k on the in-process audio index, then one query for the metadata of the matching talks only.
+    # Returns None when the metric can only be served by Weaviate
+    global audio_index
+
+    if similarity_metric not in supported_metrics:
+        return None
+    with audio_index_lock:
+        if audio_index is None:
+            audio_index = AudioIndex()
+    audio_index.ensure_synced(client)
+
+    matches = audio_index.search(audio_features, limit, similarity_metric)
+    if not matches:
+        return []
+
+    talk_uuids = list(dict.fromkeys(talk_uuid for talk_uuid, _ in matches))
+    query = client.query\
+        .get("TedTalk", result_parameters)\
+        .with_where(uuid_filter(talk_uuids))\
+        .with_limit(len(talk_uuids))\
+        .with_additional(["id"])
+    talks_by_uuid = {talk["_additional"]["id"]: talk for talk in execute_query(query)}
+
+    # same order and same shape as the talk entries returned by Weaviate
+    talks = []
+    for talk_uuid, distance in matches:
+        if talk_uuid in talks_by_uuid:
+            talks.append(dict(talks_by_uuid[talk_uuid], _additional={"id": talk_uuid, "distance": distance}))
+    return talks
+
+
+def audio_search_results(client, audio_features, limit=3, use_local_index=True):
+    parameters_string = ' '.join(result_parameters)
+
+    def run_query():
+        if use_local_index:
+            try:
+                talks = local_audio_search(client, audio_features, limit)
+            except Exception as error:
+                # a broken cached index must not break the search: Weaviate can still answer the query
+                print(f"Local audio index unavailable ({error}), searching on Weaviate")
+                talks = None
+            if talks is not None:
+                return talks
+
+        query = (
+            client.query
+            .get("TedTalkAudio", [
+                "talk_entry { ... on TedTalk { " + parameters_string + " _additional { id } } }"
+            ])
+            .with_near_vector({
+                "vector": audio_features
+            })
+            .with_limit(limit)
+        )
+
+        ted_talk_audios = execute_query(query, "TedTalkAudio")
+        return [ted_talk_audio["talk_entry"][0] for ted_talk_audio in ted_talk_audios]
+
+    # the query "text" of an audio search is the hash of its embedding
+    features_hash = hashlib.sha1(np.asarray(audio_features, dtype=np.float32).tobytes()).hexdigest()
+    return cached_results("audio", features_hash, limit, result_parameters, run_query)
+
+
+def audio_search(client, device):
     audio_file_path = input("> Audio file path: ")
     if not os.path.exists(audio_file_path):
         print(f"Could not find file {audio_file_path}")
         return
+    index, _ = ask_user_choice("Estrazione delle feature audio:", ["Completa", "Progressiva (si ferma prima)"])
+
+    # the summarizer keeps loading while the audio features are extracted
+    start_time = time.perf_counter()
+    start_summarizer_loading(device)
+
+    key, audio_features = get_stored_audio_embedding(audio_file_path)
+    if index == 1 and audio_features is None:
+        talk_entries, audio_features, processed_seconds, complete = \
+            progressive_audio_search_results(client, audio_file_path, device)
+        total_seconds = get_audio_feature_extractor(device).get_duration(audio_file_path)
+        print(f"Processed {processed_seconds:.0f}s of {total_seconds:.0f}s of audio")
+        if complete and audio_features is not None:
+            audio_embedding_store.add(key, audio_features, item_id=os.path.basename(audio_file_path))
+    else:
+        audio_features = get_audio_embedding(audio_file_path, device)
+        print("Querying the database...")
+        talk_entries = audio_search_results(client, audio_features)
 
-    print("Extracting audio features...")
-    audio_features = audio_feature_extractor.extract_long_audio_embedding(audio_file_path)
-
-    print("Querying the database...")
-    parameters_string = ' '.join(parameters)
-    response = (
-        client.query
-        .get("TedTalkAudio", [
-            "talk_entry { ... on TedTalk { " + parameters_string + " } }"
-        ])
-        .with_near_vector({
-            "vector": audio_features
-        })
-        .with_limit(3)
-        .do()
-    )
-
-    ted_talk_audios = response["data"]["Get"]["TedTalkAudio"]
-    for ted_talk_audio in ted_talk_audios:
-        talk_entry = ted_talk_audio["talk_entry"][0]
-        print_result(talk_entry)
+    print_results_pipelined(client, talk_entries, start_time)
 
 
 if __name__ == '__main__':
     device = "cpu"
-    print("Initializing summarizer model...")
     try:
         _create_unverified_https_context = ssl._create_unverified_context
     except AttributeError:
@@ -243,13 +596,18 @@ if __name__ == '__main__':
     else:
         ssl._create_default_https_context = _create_unverified_https_context
 
-    nltk.download("punkt")
-
-    summarizer = pipeline("summarization", model=summarizer_model_name, device=device)
+    # Q&A never needs the summarizer: the other modes wait for it only when they print the first summary
+    print("Loading the summarizer model in the background...")
+    start_summarizer_loading(device)
+    summary_cache = SummaryCache()
 
     print("Connecting to weaviate...")
     client = weaviate.Client("http://localhost:8080")
 
+    load_schema_settings(client)
+    query_cache = QueryCache()
+
+    print(f"(menu pronto in {time.perf_counter() - boot_time:.2f}s)")
     while True:
         choices = ["Ricerca semantica", "Ricerca ibrida testuale/semantica", "Question & Answer", "Ricerca audio", "Quit"]
         index, _ = ask_user_choice("Cosa vuoi fare?", choices)
@@ -263,5 +621,7 @@ if __name__ == '__main__':
         elif index == 3:
             audio_search(client, device)
         elif index == 4:
+            print(f"Summary cache: {summary_cache.stats()}")
+            print(f"Query cache: {query_cache.stats()}")
             exit()
 
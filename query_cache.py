@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+schema_version_path = "cache/schema_version"
+
+
+def bump_schema_version(path=schema_version_path):
+    # Called by system_init whenever the stored data changes: every QueryCache watching this file is invalidated
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as version_file:
+        version_file.write(uuid.uuid4().hex)
+    os.replace(temporary_path, path)
+
+
+def read_schema_version(path=schema_version_path):
+    try:
+        with open(path, "r", encoding="utf-8") as version_file:
+            return version_file.read().strip()
+    except OSError:
+        return None
+
+
+class QueryCache:
+    """
+        LRU cache with a time to live for query results. It is emptied as soon as system_init rebuilds or updates
+        the database, which is detected through the schema version file.
+    """
+    capacity = None
+    ttl = None
+
+    def __init__(self, capacity=256, ttl=600, version_path=schema_version_path):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.version_path = version_path
+        self.entries = OrderedDict()  # key -> (expiration time, results)
+        self.lock = threading.Lock()
+        self.version = read_schema_version(version_path)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def build_key(mode, text, limit, additional_parameters, metric):
+        normalized_text = " ".join(str(text).lower().split())
+        if not isinstance(additional_parameters, str):
+            additional_parameters = " ".join(additional_parameters or [])
+        return mode, normalized_text, limit, additional_parameters, metric
+
+    def _check_version(self):
+        version = read_schema_version(self.version_path)
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+            self.invalidations += 1
+
+    def get(self, key):
+        with self.lock:
+            self._check_version()
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]  # expired
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, results):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        results = self.get(key)
+        if results is None:
+            results = compute()
+            self.put(key, results)
+        # callers add fields (e.g. transcripts) to the returned talks: they get copies, the cache keeps the original
+        return [dict(result) for result in results]
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "hit_ratio": self.hit_ratio()
+        }
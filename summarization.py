@@ -0,0 +1,213 @@
+import os
+
+import tracing
+
+
+summarizer_model_name = "facebook/bart-large-cnn"
+
+# Generation parameters of the original summarizer
+default_summarizer_parameters = {
+    "length_penalty": 5.0,
+    "num_beams": 4,
+    "max_length": 256,
+    "early_stopping": True,
+    "do_sample": False
+}
+
+# Summarization engines, selected with the TED_SUMMARIZER_ENGINE environment variable. The int8 engines apply torch
+# dynamic quantization to the linear layers of BART (CPU only) and may decode with fewer beams or greedily
+summarizer_engines = {
+    "default": {"quantize": False, "num_beams": 4},
+    "int8": {"quantize": True, "num_beams": 4},
+    "int8-2beams": {"quantize": True, "num_beams": 2},
+    "int8-greedy": {"quantize": True, "num_beams": 1},
+}
+summarizer_engine = os.environ.get("TED_SUMMARIZER_ENGINE", "default")
+if summarizer_engine not in summarizer_engines:
+    raise ValueError(f"Unknown summarizer engine {summarizer_engine!r}, expected one of {list(summarizer_engines)}")
+
+# Number of threads torch uses for the summarizer (TED_TORCH_THREADS), 0 keeps the torch default
+summarizer_torch_threads = int(os.environ.get("TED_TORCH_THREADS", "0"))
+
+# Tokens left free in every chunk of split_large_text_in_segments
+segment_token_margin = 2
+
+
+def engine_parameters(engine):
+    num_beams = summarizer_engines[engine]["num_beams"]
+    # early stopping only applies to beam search
+    return dict(default_summarizer_parameters, num_beams=num_beams, early_stopping=num_beams > 1)
+
+
+def engine_cache_name(engine):
+    # a quantized model writes different summaries than the original one with the same parameters
+    return summarizer_model_name if engine == "default" else f"{summarizer_model_name}+{engine}"
+
+
+# Generation parameters and model name of the selected engine, they are also part of the summary cache key
+summarizer_parameters = engine_parameters(summarizer_engine)
+summarizer_cache_name = engine_cache_name(summarizer_engine)
+
+# Summarizer owned by a process pool worker, see init_summarizer_worker
+worker_summarizer = None
+
+# Italian punkt model, loaded once by get_sentence_tokenizer
+sentence_tokenizer = None
+
+
+def ensure_punkt():
+    # The punkt models are downloaded only when they are not installed yet: no network access at every startup
+    import nltk
+
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        nltk.download("punkt")
+
+
+def get_sentence_tokenizer():
+    global sentence_tokenizer
+
+    if sentence_tokenizer is None:
+        import nltk
+
+        # the same punkt model used by nltk.tokenize.sent_tokenize(text, language="italian")
+        sentence_tokenizer = nltk.data.load("tokenizers/punkt/italian.pickle")
+    return sentence_tokenizer
+
+
+@tracing.traced("split_large_text_in_segments")
+def split_large_text_in_segments(long_text, tokenizer):
+    # https://discuss.huggingface.co/t/summarization-on-long-documents/920/24
+    # The whole text is tokenized once with the fast tokenizer: the token offsets tell which sentence each token
+    # belongs to, so chunks are cut on sentence boundaries by slicing the original text. A sentence that alone
+    # exceeds the model window is split on token boundaries.
+    # Token counts come from the full text, where a word following a space is usually one token. A chunk sliced
+    # from the text starts without that space, and its first word can take one more token when the pipeline
+    # tokenizes the chunk again: the margin keeps every chunk, hard split pieces included, inside the window
+    max_length = tokenizer.max_len_single_sentence - segment_token_margin
+    sentence_spans = list(get_sentence_tokenizer().span_tokenize(long_text))
+    if not sentence_spans:
+        return []
+
+    encoding = tokenizer(long_text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+
+    # assign every token offset to its sentence, both lists are sorted by position
+    sentence_tokens = [[] for _ in sentence_spans]
+    sentence_index = 0
+    for token_start, token_end in encoding["offset_mapping"]:
+        while sentence_index < len(sentence_spans) - 1 and token_start >= sentence_spans[sentence_index][1]:
+            sentence_index += 1
+        sentence_tokens[sentence_index].append((token_start, token_end))
+
+    chunks = []
+    chunk_start = None
+    chunk_end = None
+    length = 0
+    for (sentence_start, sentence_end), tokens in zip(sentence_spans, sentence_tokens):
+        if length + len(tokens) > max_length and chunk_start is not None:
+            chunks.append(long_text[chunk_start:chunk_end])  # save the chunk
+            chunk_start = None
+            length = 0
+
+        if len(tokens) > max_length:
+            # oversized sentence: hard split it in pieces of max_length tokens
+            for piece_start in range(0, len(tokens), max_length):
+                piece = tokens[piece_start:piece_start + max_length]
+                chunks.append(long_text[piece[0][0]:piece[-1][1]])
+            continue
+
+        if chunk_start is None:
+            chunk_start = sentence_start
+        chunk_end = sentence_end
+        length += len(tokens)
+
+    if chunk_start is not None:
+        chunks.append(long_text[chunk_start:chunk_end])  # save the last chunk
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def create_summarizer(device, engine=None, torch_threads=None, model_name=summarizer_model_name):
+    import torch
+    from transformers import pipeline
+
+    engine = engine or summarizer_engine
+    torch_threads = torch_threads or summarizer_torch_threads
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+
+    summarizer = pipeline("summarization", model=model_name, device=device)
+    if summarizer_engines[engine]["quantize"]:
+        if device != "cpu":
+            raise ValueError(f"The {engine} summarizer engine only runs on the cpu")
+        # the weights of every linear layer become int8, activations are quantized on the fly
+        torch.quantization.quantize_dynamic(summarizer.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return summarizer
+
+
+def summarize(summarizer, long_text, parameters=None):
+    # Since this summarizer can't handle texts longer than 1024 characters, we need to split the input text in
+    # sentences shorter than 1024. We summarize each sentence and then we join the summarized results
+
+    tokenizer = summarizer.tokenizer
+    text_chunks = split_large_text_in_segments(long_text, tokenizer)
+    return summarize_chunks(summarizer, text_chunks, parameters)
+
+
+def summarize_chunks(summarizer, text_chunks, parameters=None):
+    # Performs summarization
+    with tracing.span("summarizer", chunks=len(text_chunks)):
+        summaries = summarizer(text_chunks, **(parameters or summarizer_parameters))
+
+    # Joins the results to get a single text
+    summary = ""
+    for r in summaries:
+        summary += r["summary_text"] + " "
+
+    # Returns the summary
+    return summary
+
+
+def summarize_many(summarizer, long_texts, batch_size=8, parameters=None):
+    # Summarizes several texts with one batched generation call. The chunks of every text are gathered together,
+    # sorted by length so that each batch pads as little as possible and finally routed back to their own text
+
+    tokenizer = summarizer.tokenizer
+    chunks = []  # (text index, chunk position, chunk text)
+    for text_index, long_text in enumerate(long_texts):
+        for chunk_position, chunk in enumerate(split_large_text_in_segments(long_text, tokenizer)):
+            chunks.append((text_index, chunk_position, chunk))
+
+    if not chunks:
+        return ["" for _ in long_texts]
+
+    # the character length is a cheap and good enough proxy of the token length
+    chunks.sort(key=lambda entry: len(entry[2]))
+    with tracing.span("summarizer", chunks=len(chunks), batch_size=batch_size):
+        summaries = summarizer([chunk for _, _, chunk in chunks], batch_size=batch_size,
+                               **(parameters or summarizer_parameters))
+
+    chunk_summaries = [{} for _ in long_texts]
+    for (text_index, chunk_position, _), r in zip(chunks, summaries):
+        chunk_summaries[text_index][chunk_position] = r["summary_text"]
+
+    # Joins the results in the original chunk order, exactly like summarize does
+    results = []
+    for text_chunk_summaries in chunk_summaries:
+        summary = ""
+        for chunk_position in sorted(text_chunk_summaries):
+            summary += text_chunk_summaries[chunk_position] + " "
+        results.append(summary)
+    return results
+
+
+def init_summarizer_worker(model_name, device, torch_threads):
+    global worker_summarizer
+
+    # every worker has its own model, so it must not compete with the other workers for the cores
+    worker_summarizer = create_summarizer(device, torch_threads=torch_threads, model_name=model_name)
+
+
+def summarize_in_worker(talk_id, transcript):
+    return talk_id, summarize(worker_summarizer, transcript)
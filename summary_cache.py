@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class SummaryCache:
+    """
+        Two-tier cache for talk summaries: a small in-memory LRU in front of a size-bounded directory on disk.
+        Entries are keyed by talk id, transcript hash, summarizer model name and generation parameters, so a
+        changed transcript or a different decoding setup never returns a stale summary.
+    """
+    memory_entries = None
+    memory_capacity = None
+    cache_dir = None
+    max_disk_bytes = None
+
+    def __init__(self, cache_dir="cache/summaries", memory_capacity=128, max_disk_bytes=64 * 1024 * 1024,
+                 eviction_ratio=0.9):
+        self.memory_entries = OrderedDict()
+        self.memory_capacity = memory_capacity
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        # the eviction goes below the limit, down to this fraction of it, so that it does not run again on the next put
+        self.eviction_ratio = eviction_ratio
+        # shared by the prefetch thread of main.py (get) and the thread printing the results (put)
+        self.lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self.disk_size = 0
+        self._scan_disk_entries()
+
+    @staticmethod
+    def build_key(talk_id, transcript, model_name, generation_parameters):
+        transcript_hash = hashlib.sha1(transcript.encode("utf-8")).hexdigest()
+        parameters_string = json.dumps(generation_parameters, sort_keys=True)
+        raw_key = f"{talk_id}|{transcript_hash}|{model_name}|{parameters_string}"
+        return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _scan_disk_entries(self):
+        # The index is rebuilt from the directory, which other processes may have changed (main.py and
+        # batch_runner.py share it)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+
+        entries.sort()
+        self.disk_entries = OrderedDict((key, size) for _, key, size in entries)
+        self.disk_size = sum(size for _, _, size in entries)
+
+    def _track_disk_entry(self, key, size):
+        self.disk_size += size - self.disk_entries.get(key, 0)
+        self.disk_entries[key] = size
+        self.disk_entries.move_to_end(key)
+
+    def _remember(self, key, summary):
+        self.memory_entries[key] = summary
+        self.memory_entries.move_to_end(key)
+        if len(self.memory_entries) > self.memory_capacity:
+            self.memory_entries.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory_entries:
+                self.memory_entries.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory_entries[key]
+
+            entry_path = self._entry_path(key)
+            try:
+                with open(entry_path, "r", encoding="utf-8") as entry_file:
+                    summary = json.load(entry_file)["summary"]
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+
+            # refresh the access time so that the disk eviction is LRU as well
+            try:
+                os.utime(entry_path)
+                self._track_disk_entry(key, os.path.getsize(entry_path))
+            except OSError:
+                pass  # evicted in the meantime, the summary that was read is still valid
+            self.disk_hits += 1
+            self._remember(key, summary)
+            return summary
+
+    def put(self, key, summary):
+        with self.lock:
+            self._remember(key, summary)
+
+            # write to a temporary file first, so a crash never leaves a truncated entry behind
+            entry_path = self._entry_path(key)
+            temporary_path = entry_path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as entry_file:
+                json.dump({"summary": summary}, entry_file, ensure_ascii=False)
+            os.replace(temporary_path, entry_path)
+
+            self._track_disk_entry(key, os.path.getsize(entry_path))
+            if self.disk_size > self.max_disk_bytes:
+                self._evict_disk_entries()
+
+    def get_or_compute(self, key, compute):
+        summary = self.get(key)
+        if summary is None:
+            summary = compute()
+            self.put(key, summary)
+        return summary
+
+    def _evict_disk_entries(self):
+        # only reached when the running total is over the limit: the directory is scanned again to catch the entries
+        # written by other processes, then the least recently used entries are removed first
+        self._scan_disk_entries()
+        target_size = self.max_disk_bytes * self.eviction_ratio
+        while self.disk_entries and self.disk_size > target_size:
+            key, size = self.disk_entries.popitem(last=False)
+            self.disk_size -= size
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                continue
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hit_ratio = (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": hit_ratio
+        }
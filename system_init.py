@@ -1,22 +1,46 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
 import pandas as pd
 import weaviate
 from weaviate.util import generate_uuid5
 from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2Model
 
-from audio_feature_extractor import AudioFeatureExtractor
+from audio_embedding_engine import embed_audio_files
+from batch_writer import AdaptiveBatchWriter
+from ingest_manifest import load_manifest, save_manifest, delete_manifest, talk_content_hash, audio_fingerprint
+from query_cache import bump_schema_version
+from summarization import summarizer_model_name, init_summarizer_worker, summarize_in_worker, ensure_punkt
+import tracing
 from util import *
 
 
 ted_talks_csv_path = "dataset/ted_talks_it.csv"
 ted_talks_zip_path = "dataset/ted_talks_it.zip"
 ted_talks_audio_path = "dataset/AUDIO/"
+summaries_checkpoint_path = "cache/ingest_summaries.jsonl"
+csv_chunk_size = 256  # CSV rows held in memory at once
+related_talks_edges_path = "cache/related_talks_edges.npy"
 
 #audio_model_name = "facebook/wav2vec2-large-xlsr-53"
 audio_model_name = "facebook/wav2vec2-base-100k-voxpopuli"
+audio_embedding_workers = 4  # each worker process loads its own audio model
+# Chunks per forward pass in each worker. Every chunk is 60s of 16kHz audio, and wav2vec2 keeps activations
+# proportional to the batch for the whole pass: a batch of 4 costs roughly 4 times the peak memory of a batch of 1,
+# multiplied by audio_embedding_workers. The workers already keep the cores busy, so bigger batches gain little here
+audio_embedding_batch_size = 1
 
 TedTalkClassName = "TedTalk"
 TedTalkAudioClassName = "TedTalkAudio"
+TedTalkPassageClassName = "TedTalkPassage"
+
+# Transcripts are split in overlapping passages for Q&A: a passage fits the window of the Q&A model, and an answer
+# cut by the end of a passage is whole in the next one
+passage_length = 1000  # characters
+passage_overlap = 200
 
 def is_database_already_configured():
     print("Getting the schema...")
@@ -25,9 +49,11 @@ def is_database_already_configured():
     return class_already_exists
 
 
+@tracing.traced("system_init.create_schema")
 def create_schema(ted_talk_object_schema):
     print(f"Creating database schema...")
     client.schema.create(ted_talk_object_schema)
+    bump_schema_version()  # the cached query results of main.py are no longer valid
 
 
 def ask_for_similarity_metric():
@@ -38,22 +64,23 @@ def ask_for_similarity_metric():
 
 
 def build_talk_object(row):
+    # the python literal columns are already converted by convert_literal_columns
     return {
         "talk_id": row.talk_id,
         "title": row.title,
         "speaker_1": row.speaker_1,
-        "all_speakers": dict_values_to_list_of_strings(row.all_speakers),
-        "occupations": dict_values_to_list_of_strings(row.occupations),
-        "about_speakers": dict_values_to_list_of_strings(row.about_speakers),
+        "all_speakers": row.all_speakers,
+        "occupations": row.occupations,
+        "about_speakers": row.about_speakers,
         "views": to_int(row.views),
         "recorded_date": to_date(row.recorded_date),
         "published_date": to_date(row.published_date),
         "event": row.event,
         "native_lang": row.native_lang,
-        "available_lang": list_string_to_python_list(row.available_lang),
+        "available_lang": row.available_lang,
         "comments": to_int(row.comments),
         "duration": to_int(row.duration),
-        "topics": list_string_to_python_list(row.topics),
+        "topics": row.topics,
         # related_talks is set manually to add talk references
         "url": row.url,
         "description": row.description,
@@ -202,6 +229,16 @@ ted_talk_object_schema = {
                     "name": "transcript",
                     "description": "Talk's transcription",
                     "dataType": ["text"]
+                },
+                {
+                    "name": "summary",
+                    "description": "Talk's summary, precomputed at ingest time",
+                    "dataType": ["text"],
+                    "moduleConfig": {
+                        "text2vec-transformers": {
+                            "skip": True
+                        }
+                    }
                 }
 
             ],
@@ -232,6 +269,41 @@ ted_talk_object_schema = {
             "vectorIndexConfig": {
                 "distance": "cosine",
             }
+        },
+        {
+            "class": TedTalkPassageClassName,
+            "description": "A passage of a Ted Talk's transcript, the unit searched by Q&A",
+            "vectorizer": "text2vec-transformers",
+            "properties": [
+                {
+                    "name": "text",
+                    "description": "The passage text",
+                    "dataType": ["text"]
+                },
+                {
+                    "name": "talk_id",
+                    "description": "Id of the talk this passage belongs to",
+                    "dataType": ["int"]
+                },
+                {
+                    "name": "start_offset",
+                    "description": "Offset of the first character of the passage in the talk's transcript",
+                    "dataType": ["int"]
+                },
+                {
+                    "name": "end_offset",
+                    "description": "Offset right after the last character of the passage in the talk's transcript",
+                    "dataType": ["int"]
+                },
+                {
+                    "name": "talk_entry",
+                    "description": "Cross reference to the talk this passage belongs to",
+                    "dataType": ["TedTalk"]
+                }
+            ],
+            "vectorIndexConfig": {
+                "distance": "cosine",
+            }
         }
     ]
 }
@@ -251,53 +323,226 @@ def check_dataset_files():
         exit(-1)
 
 
-def store_ted_talks(batch, ted_talks, id_to_uuid):
+def read_csv_chunks(csv_path, chunk_size=csv_chunk_size):
+    # Reads the CSV a bounded number of rows at a time, so the memory usage does not grow with the dataset
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        yield convert_literal_columns(chunk.fillna(value=""))
+
+
+def iter_csv_rows(csv_path, chunk_size=csv_chunk_size):
+    for chunk in read_csv_chunks(csv_path, chunk_size):
+        yield from chunk.itertuples(index=False)
+
+
+@tracing.traced("system_init.store_ted_talks")
+def store_ted_talks(batch, talk_objects, id_to_uuid):
     print("Storing objects...")
-    for index, talk in enumerate(ted_talks):
-        print_progress_bar(index, len(ted_talks))
+    index = 0
+    for index, talk in enumerate(talk_objects, start=1):
+        print(f"\r{index} objects", end="")
         batch.add_data_object(
             data_object=talk,
             class_name="TedTalk",
             uuid=id_to_uuid[talk["talk_id"]]
         )
+    print(f"\r{index} objects")
+
+
+@tracing.traced("system_init.build_related_talks_edges")
+def build_related_talks_edges(related_talks, id_to_uuid):
+    # Builds the deduplicated (from_uuid, to_uuid) edge list of the whole dataset in one pass. Edges pointing to a
+    # talk missing from this dataset are counted and dropped
+    from_ids = []
+    to_ids = []
+    for talk_id, related_talks_ids in related_talks.items():
+        from_ids.extend([talk_id] * len(related_talks_ids))
+        to_ids.extend(related_talks_ids)
+
+    edges = pd.DataFrame({
+        "from": pd.Series(from_ids, dtype=object).map(id_to_uuid),
+        "to": pd.to_numeric(pd.Series(to_ids, dtype=object), errors="coerce").map(id_to_uuid)
+    })
+    dropped_edges = int(edges["to"].isna().sum())
+    edges = edges.dropna().drop_duplicates()
+    return edges.to_numpy(dtype=str).reshape(-1, 2), dropped_edges
+
+
+@tracing.traced("system_init.store_ted_talks_relations")
+def store_ted_talks_relations(batch, related_talks, id_to_uuid, edges_path=None):
+    print("Creating object references...")
+    edges, dropped_edges = build_related_talks_edges(related_talks, id_to_uuid)
+    if dropped_edges:
+        print(f"{dropped_edges} references to talks not found in this dataset were dropped")
+
+    if edges_path is not None:
+        os.makedirs(os.path.dirname(edges_path), exist_ok=True)
+        np.save(edges_path, edges)
+
+    batch.add_references(edges, TedTalkClassName, "related_talks", TedTalkClassName)
+    print(f"{len(edges)} references queued")
+
+
+@tracing.traced("system_init.store_ted_talk_passages")
+def store_ted_talk_passages(batch, rows, id_to_uuid, talk_ids=None):
+    # Streams the CSV again: every transcript is split in passages that reference their talk. Only the talks in
+    # talk_ids are processed, when given
+    print("Storing transcript passages...")
+    edges = []
+    for row in rows:
+        if talk_ids is not None and row.talk_id not in talk_ids:
+            continue
+
+        talk_uuid = id_to_uuid[row.talk_id]
+        for start_offset, end_offset in split_in_passages(row.transcript, passage_length, passage_overlap):
+            passage_uuid = generate_uuid5(f"{talk_uuid}:{start_offset}:{end_offset}", TedTalkPassageClassName)
+            batch.add_data_object(
+                data_object={
+                    "text": row.transcript[start_offset:end_offset],
+                    "talk_id": row.talk_id,
+                    "start_offset": start_offset,
+                    "end_offset": end_offset
+                },
+                class_name=TedTalkPassageClassName,
+                uuid=passage_uuid
+            )
+            edges.append((passage_uuid, talk_uuid))
+        print(f"\r{len(edges)} passages", end="")
 
+    batch.add_references(edges, TedTalkPassageClassName, "talk_entry", TedTalkClassName)
+    print(f"\r{len(edges)} passages")
 
-def store_ted_talks_relations(batch, ted_talks_it_dataframe, id_to_uuid):
-    print("Creating object references...")
-    for index, row in ted_talks_it_dataframe.iterrows():
-        print_progress_bar(index, len(ted_talks_it_dataframe))
-        this_talk_id = id_to_uuid[row.talk_id]
-        related_talks_ids = dict_keys_to_list_of_strings(row.related_talks)
-
-        for talk_id in related_talks_ids:
-            talk_id = to_int(talk_id)
-            if talk_id in id_to_uuid:
-                related_talk_uuid = id_to_uuid[talk_id]
-                batch.add_reference(
-                    from_object_uuid=this_talk_id,
-                    from_object_class_name=TedTalkClassName,
-                    from_property_name="related_talks",
-                    to_object_uuid=related_talk_uuid,
-                    to_object_class_name=TedTalkClassName,
-                )
-            else:
-                print(f"Talk id {talk_id} not found in this dataset. Reference dropped")
 
+def delete_ted_talk_passages(client, talk_id):
+    client.batch.delete_objects(
+        class_name=TedTalkPassageClassName,
+        where={"path": ["talk_id"], "operator": "Equal", "valueInt": talk_id}
+    )
 
-def prepare_objects(ted_talks_it_dataframe, id_to_uuid, ted_talks):
+
+def class_exists(client, class_name):
+    return any(x for x in client.schema.get()["classes"] if x["class"] == class_name)
+
+
+def prepare_objects(rows, id_to_uuid, related_talks, summaries=None, content_hashes=None):
+    # Generator: every talk object is built right before it is sent to the batch and is not kept around. Only the
+    # small id -> uuid map and the related talks ids are kept for the following stages
     print("Preparing data objects...")
-    for ix, row in ted_talks_it_dataframe.iterrows():
+    for row in rows:
         talk_object = build_talk_object(row)
 
         talk_uuid = generate_uuid5(talk_object, TedTalkClassName)
         id_to_uuid[talk_object["talk_id"]] = talk_uuid
-        ted_talks.append(talk_object)
-
-
-def store_talk_audio_embeddings(batch, ted_talks_it_dataframe, id_to_uuid, audio_feature_extractor):
+        related_talks[talk_object["talk_id"]] = row.related_talks
+        if content_hashes is not None:
+            content_hashes[talk_object["talk_id"]] = talk_content_hash(talk_object, row.related_talks)
+
+        # the summary is added after the uuid is generated, so that it does not change the talk's uuid
+        if summaries and talk_object["talk_id"] in summaries:
+            talk_object["summary"] = summaries[talk_object["talk_id"]]
+        yield talk_object
+
+
+def ask_for_summaries_precomputation():
+    index, _ = ask_user_choice("Generare ora i riassunti dei talk? (richiede tempo, si può riprendere)", ["Sì", "No"])
+    return index == 0
+
+
+def transcript_hash(transcript):
+    return hashlib.sha1(transcript.encode("utf-8")).hexdigest()
+
+
+def load_summaries_checkpoint():
+    # Every finished summary is appended to the checkpoint, so a crashed run resumes from where it stopped
+    summaries = {}
+    if not os.path.exists(summaries_checkpoint_path):
+        return summaries
+
+    with open(summaries_checkpoint_path, "r", encoding="utf-8") as checkpoint:
+        for line in checkpoint:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a partially written line left by a crash
+            summaries[entry["talk_id"]] = entry
+    return summaries
+
+
+def load_checkpoint_summaries(rows):
+    # The checkpointed summaries whose transcript did not change. They are written even when the precomputation is
+    # skipped, because writing a talk replaces the whole object, summary included
+    checkpoint_entries = load_summaries_checkpoint()
+    summaries = {}
+    if not checkpoint_entries:
+        return summaries
+
+    for row in rows:
+        talk_id = to_int(row.talk_id)
+        entry = checkpoint_entries.get(talk_id)
+        if entry is not None and entry["transcript_hash"] == transcript_hash(row.transcript):
+            summaries[talk_id] = entry["summary"]
+    return summaries
+
+
+@tracing.traced("system_init.precompute_summaries")
+def precompute_summaries(rows, device, num_workers=2):
+    print("Precomputing summaries...")
+    ensure_punkt()  # the workers split the transcripts with the punkt model, they must find it installed
+    checkpoint_entries = load_summaries_checkpoint()
+    os.makedirs(os.path.dirname(summaries_checkpoint_path), exist_ok=True)
+    torch_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+    summaries = {}
+    in_flight = {}  # future -> transcript hash
+    max_in_flight = num_workers * 2  # only a few transcripts are held in memory at any time
+    generated = 0
+
+    def collect(futures):
+        nonlocal generated
+        for future in futures:
+            talk_id, summary = future.result()
+            summaries[talk_id] = summary
+            checkpoint.write(json.dumps({
+                "talk_id": talk_id,
+                "transcript_hash": in_flight.pop(future),
+                "summary": summary
+            }, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            generated += 1
+            print(f"\r{generated} summaries generated", end="")
+
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             initializer=init_summarizer_worker,
+                             initargs=(summarizer_model_name, device, torch_threads)) as executor, \
+            open(summaries_checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for row in rows:
+            talk_id = to_int(row.talk_id)
+            row_transcript_hash = transcript_hash(row.transcript)
+            entry = checkpoint_entries.get(talk_id)
+            if entry is not None and entry["transcript_hash"] == row_transcript_hash:
+                summaries[talk_id] = entry["summary"]
+                continue
+            if len(row.transcript) == 0:
+                continue
+
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(summarize_in_worker, talk_id, row.transcript)] = row_transcript_hash
+
+        collect(list(in_flight))
+
+    print(f"\n{len(summaries) - generated} summaries restored from checkpoint, {generated} generated")
+    return summaries
+
+
+@tracing.traced("system_init.store_talk_audio_embeddings")
+def store_talk_audio_embeddings(batch, talk_ids, id_to_uuid, device, num_workers, store=None):
+    # Returns the manifest audio entries of the stored talks
     print("Preparing and storing audio embeddings...")
-    for index, row in ted_talks_it_dataframe.iterrows():
-        file_name = f"{row.talk_id}.mp3"
+    audio_entries = {}
+    file_path_to_talk_id = {}
+    for talk_id in talk_ids:
+        file_name = f"{talk_id}.mp3"
         audio_file_path = ted_talks_audio_path + file_name
 
         # check if the mp3 file exists
@@ -305,12 +550,17 @@ def store_talk_audio_embeddings(batch, ted_talks_it_dataframe, id_to_uuid, audio
             print(f"Audio file {audio_file_path} not found: ignoring this entry")
             continue
 
+        file_path_to_talk_id[audio_file_path] = talk_id
+
+    # the files are embedded by a pool of worker processes and returned as soon as each one is ready
+    file_embeddings = embed_audio_files(list(file_path_to_talk_id), audio_model_name, device, num_workers, store,
+                                        audio_embedding_batch_size)
+    for index, (audio_file_path, file_key, file_features) in enumerate(file_embeddings):
         # print progress so far
-        print_progress_bar(index, len(ted_talks_it_dataframe))
+        print_progress_bar(index + 1, len(file_path_to_talk_id))
 
-        # if the mp3 file exists, then extract its features and add them to the database
-        file_features = audio_feature_extractor.extract_long_audio_embedding(audio_file_path)
-        talk_uuid = id_to_uuid[row.talk_id]
+        file_name = os.path.basename(audio_file_path)
+        talk_uuid = id_to_uuid[file_path_to_talk_id[audio_file_path]]
 
         # construct Talk Audio Object
         talk_audio_object = {
@@ -337,55 +587,213 @@ def store_talk_audio_embeddings(batch, ted_talks_it_dataframe, id_to_uuid, audio
             to_object_class_name=TedTalkClassName,
         )
 
+        audio_entries[file_path_to_talk_id[audio_file_path]] = {
+            "audio_fingerprint": audio_fingerprint(audio_file_path),
+            "audio_key": file_key,
+            "audio_uuid": talk_audio_uuid
+        }
+
+    return audio_entries
+
+
+def build_manifest(id_to_uuid, content_hashes, audio_entries, summarized_ids=()):
+    talks = {}
+    for talk_id, talk_uuid in id_to_uuid.items():
+        talks[str(talk_id)] = {"hash": content_hashes[talk_id], "uuid": talk_uuid,
+                               "summarized": talk_id in summarized_ids}
+        talks[str(talk_id)].update(audio_entries.get(talk_id, {}))
+    return {"talks": talks}
+
+
+def find_changed_audio(talk_ids, manifest_talks):
+    changed_talk_ids = []
+    removed_audio_uuids = []
+    for talk_id in talk_ids:
+        entry = manifest_talks.get(str(talk_id), {})
+        audio_file_path = ted_talks_audio_path + f"{talk_id}.mp3"
+        if not os.path.exists(audio_file_path):
+            if "audio_uuid" in entry:
+                removed_audio_uuids.append(entry["audio_uuid"])
+        elif entry.get("audio_fingerprint") != audio_fingerprint(audio_file_path):
+            changed_talk_ids.append(talk_id)
+    return changed_talk_ids, removed_audio_uuids
+
+
+@tracing.traced("system_init.run_incremental_ingest")
+def run_incremental_ingest(client, device, manifest, summaries=None):
+    # Only the talks whose content changed since the last ingest are written again. The uuids recorded in the
+    # manifest are kept, so the references pointing to an updated talk stay valid
+    manifest_talks = manifest["talks"]
+    id_to_uuid = {}
+    related_talks = {}
+    content_hashes = {}
+    new_ids = set()
+    changed_ids = set()
+
+    if summaries is None:
+        summaries = load_checkpoint_summaries(iter_csv_rows(ted_talks_csv_path))
+    summarized_ids = set()
+
+    print("Storing new and changed objects...")
+    with AdaptiveBatchWriter(client) as batch:
+        talk_objects = prepare_objects(iter_csv_rows(ted_talks_csv_path), id_to_uuid, related_talks, summaries,
+                                       content_hashes)
+        for talk in talk_objects:
+            talk_id = talk["talk_id"]
+            entry = manifest_talks.get(str(talk_id))
+            if entry is None:
+                new_ids.add(talk_id)
+            else:
+                id_to_uuid[talk_id] = entry["uuid"]
+                # a stored talk also changes when a summary became available for it
+                summary_added = "summary" in talk and not entry.get("summarized")
+                if entry["hash"] == content_hashes[talk_id] and not summary_added:
+                    if entry.get("summarized"):
+                        summarized_ids.add(talk_id)
+                    continue
+                changed_ids.add(talk_id)
+
+            if "summary" in talk:
+                summarized_ids.add(talk_id)
+
+            # a batch write with an existing uuid replaces the whole object
+            batch.add_data_object(data_object=talk, class_name=TedTalkClassName, uuid=id_to_uuid[talk_id])
+
+    deleted_ids = {int(talk_id) for talk_id in manifest_talks} - set(id_to_uuid)
+    print(f"{len(new_ids)} new, {len(changed_ids)} changed, {len(deleted_ids)} deleted talks")
+
+    # databases built before passages existed get the passages of every talk
+    passage_ids = new_ids | changed_ids
+    if not class_exists(client, TedTalkPassageClassName):
+        passage_class = next(x for x in ted_talk_object_schema["classes"] if x["class"] == TedTalkPassageClassName)
+        passage_class["vectorIndexConfig"]["distance"] = \
+            client.schema.get(TedTalkClassName)["vectorIndexConfig"]["distance"]
+        client.schema.create_class(passage_class)
+        passage_ids = set(id_to_uuid)
+    else:
+        for talk_id in changed_ids | deleted_ids:
+            delete_ted_talk_passages(client, talk_id)
+    with AdaptiveBatchWriter(client) as batch:
+        store_ted_talk_passages(batch, iter_csv_rows(ted_talks_csv_path), id_to_uuid, passage_ids)
+
+    for talk_id in deleted_ids:
+        entry = manifest_talks[str(talk_id)]
+        client.data_object.delete(entry["uuid"], class_name=TedTalkClassName)
+        if "audio_uuid" in entry:
+            client.data_object.delete(entry["audio_uuid"], class_name=TedTalkAudioClassName)
+
+    # references are rewritten for the written talks and for the talks pointing to a created or deleted one
+    appeared_or_gone = {str(talk_id) for talk_id in new_ids | deleted_ids}
+    affected_ids = new_ids | changed_ids | {
+        talk_id for talk_id, related_talks_ids in related_talks.items()
+        if appeared_or_gone.intersection(related_talks_ids)
+    }
+    print(f"Updating the references of {len(affected_ids)} talks...")
+    for talk_id in affected_ids:
+        related_uuids = [id_to_uuid[to_int(x)] for x in related_talks[talk_id] if to_int(x) in id_to_uuid]
+        client.data_object.reference.update(
+            from_uuid=id_to_uuid[talk_id],
+            from_property_name="related_talks",
+            to_uuids=related_uuids,
+            from_class_name=TedTalkClassName,
+            to_class_names=TedTalkClassName,
+        )
+
+    changed_audio_ids, removed_audio_uuids = find_changed_audio(id_to_uuid, manifest_talks)
+    for audio_uuid in removed_audio_uuids:
+        client.data_object.delete(audio_uuid, class_name=TedTalkAudioClassName)
+    with AdaptiveBatchWriter(client) as batch:
+        audio_entries = store_talk_audio_embeddings(batch, changed_audio_ids, id_to_uuid, device,
+                                                    audio_embedding_workers)
+
+    # unchanged talks keep their recorded audio entry
+    for talk_id in id_to_uuid:
+        entry = manifest_talks.get(str(talk_id), {})
+        if talk_id not in audio_entries and "audio_uuid" in entry and entry["audio_uuid"] not in removed_audio_uuids:
+            audio_entries[talk_id] = {x: entry[x] for x in ("audio_fingerprint", "audio_key", "audio_uuid")}
+
+    save_manifest(build_manifest(id_to_uuid, content_hashes, audio_entries, summarized_ids))
+    bump_schema_version()  # the cached query results of main.py are no longer valid
+
 
 def check_if_database_is_already_configured(client):
+    # Returns True when the existing data must be updated incrementally, False when it must be rebuilt
     if is_database_already_configured():
         print("Weaviate is already configured!")
-        print("Continuing will DELETE the existing TedTalk schema")
-        user_input = input("Type 'Yes' to continue, 'No' to quit")
-
-        if user_input == 'Yes':
+        manifest = load_manifest()
+        choices = ["Incremental update", "Full rebuild (DELETES the existing TedTalk schema)", "Quit"]
+        if manifest is None:
+            print("No ingest manifest found: only a full rebuild is possible")
+            choices.remove("Incremental update")
+        _, choice = ask_user_choice("What do you want to do?", choices)
+
+        if choice == "Incremental update":
+            return True
+        elif choice != "Quit":
             # Delete the schema to reset the system:
             print("Deleting the existing TedTalk schema")
+            if class_exists(client, TedTalkPassageClassName):
+                client.schema.delete_class(TedTalkPassageClassName)
             client.schema.delete_class(TedTalkClassName)
             client.schema.delete_class(TedTalkAudioClassName)
+            bump_schema_version()
         else:
             print("Quitting with no changes.")
             exit()
+    return False
 
 
 if __name__ == '__main__':
     device = "cpu"
-    print(f"Loading model {audio_model_name}...")
-    audio_feature_extractor = AudioFeatureExtractor(audio_model_name, device)
-
     check_dataset_files()
 
     print("Connecting to weaviate...")
     client = weaviate.Client("http://localhost:8080")
-    client.batch.configure(
-        batch_size=1,
-        dynamic=True,
-        num_workers=16,
-    )
 
-    check_if_database_is_already_configured(client)
+    if check_if_database_is_already_configured(client):
+        summaries = None
+        if ask_for_summaries_precomputation():
+            summaries = precompute_summaries(iter_csv_rows(ted_talks_csv_path), device)
+        run_incremental_ingest(client, device, load_manifest(), summaries)
+        print("Task completed.")
+        exit()
 
     metric = ask_for_similarity_metric()
     for class_ in ted_talk_object_schema["classes"]:
         class_["vectorIndexConfig"]["distance"] = metric
 
-    print("Reading CSV...")
-    ted_talks_it_dataframe = pd.read_csv(ted_talks_csv_path).fillna(value="")
-    ted_talks = []
     id_to_uuid = {}
-
+    related_talks = {}
+    content_hashes = {}
+
+    if ask_for_summaries_precomputation():
+        summaries = precompute_summaries(iter_csv_rows(ted_talks_csv_path), device)
+        print_peak_memory("precompute_summaries", include_children=True)
+    else:
+        summaries = load_checkpoint_summaries(iter_csv_rows(ted_talks_csv_path))
+
+    # the manifest is written again only once the whole rebuild succeeded: until then the next run must not offer an
+    # incremental update against the data that was just deleted
+    delete_manifest()
     create_schema(ted_talk_object_schema)
-    prepare_objects(ted_talks_it_dataframe, id_to_uuid, ted_talks)
-
-    with client.batch as batch:
-        store_ted_talks(batch, ted_talks, id_to_uuid)
-        store_ted_talks_relations(batch, ted_talks_it_dataframe, id_to_uuid)
-        store_talk_audio_embeddings(batch, ted_talks_it_dataframe, id_to_uuid, audio_feature_extractor)
 
+    with AdaptiveBatchWriter(client) as batch:
+        # the CSV is streamed: each talk object goes straight from its CSV row to the batch
+        talk_objects = prepare_objects(iter_csv_rows(ted_talks_csv_path), id_to_uuid, related_talks, summaries,
+                                       content_hashes)
+        store_ted_talks(batch, talk_objects, id_to_uuid)
+        print_peak_memory("store_ted_talks")
+        store_ted_talks_relations(batch, related_talks, id_to_uuid, related_talks_edges_path)
+        print_peak_memory("store_ted_talks_relations")
+        store_ted_talk_passages(batch, iter_csv_rows(ted_talks_csv_path), id_to_uuid)
+        print_peak_memory("store_ted_talk_passages")
+        audio_entries = store_talk_audio_embeddings(batch, list(id_to_uuid), id_to_uuid, device,
+                                                    audio_embedding_workers)
+        print_peak_memory("store_talk_audio_embeddings", include_children=True)
+    # bumped again once the batch is flushed: a query run by main.py while the objects were being written cached a
+    # partial result under the version bumped by create_schema
+    bump_schema_version()
+
+    # records what was stored, so that the next run can be incremental
+    save_manifest(build_manifest(id_to_uuid, content_hashes, audio_entries, set(summaries).intersection(id_to_uuid)))
     print("Task completed.")
@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+from summary_cache import SummaryCache
+from util import split_in_passages
+
+
+class CachedSummarizeManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        patcher = mock.patch.object(main, "summary_cache", SummaryCache(self.cache_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_page_with_summarized_and_unsummarized_talks(self):
+        # the summarized talk has no transcript: fetch_missing_transcripts only fetches the other ones
+        talks = [{"talk_id": 1, "summary": "stored summary"},
+                 {"talk_id": 2, "summary": None, "transcript": "A talk about ideas."}]
+        with mock.patch.object(main, "get_summarizer"), \
+                mock.patch.object(main, "summarize_many", return_value=["generated summary"]) as summarize_many:
+            self.assertEqual(main.cached_summarize_many(talks), ["stored summary", "generated summary"])
+            summarize_many.assert_called_once_with(mock.ANY, ["A talk about ideas."])
+
+            # the generated summary is now cached
+            summarize_many.reset_mock()
+            self.assertEqual(main.cached_summarize_many(talks), ["stored summary", "generated summary"])
+            summarize_many.assert_not_called()
+
+
+class PassageAnswersTest(unittest.TestCase):
+
+    @staticmethod
+    def passage_results(talk_id, transcript, answer_text):
+        # the TedTalkPassage objects written by system_init, with the answer Weaviate finds in each passage text
+        results = []
+        for start_offset, end_offset in split_in_passages(transcript, 100, 20):
+            text = transcript[start_offset:end_offset]
+            position = text.find(answer_text)
+            answer = {"hasAnswer": position != -1, "result": answer_text if position != -1 else None,
+                      "startPosition": max(position, 0), "endPosition": max(position, 0) + len(answer_text)}
+            results.append({"talk_id": talk_id, "start_offset": start_offset, "end_offset": end_offset,
+                            "talk_entry": [{"title": f"Talk {talk_id}"}], "_additional": {"answer": answer}})
+        return [x for x in results if x["_additional"]["answer"]["hasAnswer"]] + \
+            [x for x in results if not x["_additional"]["answer"]["hasAnswer"]]
+
+    def test_positions_point_into_the_transcript(self):
+        transcript = " ".join(f"word{index}" for index in range(100)) + " the answer is forty two. " + \
+            " ".join(f"other{index}" for index in range(100))
+        results = main.passage_answers(self.passage_results(7, transcript, "forty two"), limit=3)
+
+        self.assertEqual(len(results), 1)  # the best passage of the talk only
+        answer = results[0]["_additional"]["answer"]
+        self.assertEqual(results[0]["title"], "Talk 7")
+        self.assertEqual(transcript[answer["startPosition"]:answer["endPosition"]], "forty two")
+
+    def test_answer_in_the_first_passage(self):
+        transcript = "forty two is the answer. " + " ".join(f"word{index}" for index in range(100))
+        answer = main.passage_answers(self.passage_results(1, transcript, "forty two"), limit=3)[0]["_additional"]
+        self.assertEqual((answer["answer"]["startPosition"], answer["answer"]["endPosition"]), (0, 9))
+
+    def test_one_result_per_talk_up_to_the_limit(self):
+        passages = []
+        for talk_id in range(1, 5):
+            passages += self.passage_results(talk_id, f"talk {talk_id} says forty two", "forty two")
+        results = main.passage_answers(passages, limit=3)
+        self.assertEqual([x["talk_id"] for x in results], [1, 2, 3])
+        for result in results:
+            answer = result["_additional"]["answer"]
+            transcript = f"talk {result['talk_id']} says forty two"
+            self.assertEqual(transcript[answer["startPosition"]:answer["endPosition"]], "forty two")
+
+    def test_no_answer_is_not_shifted(self):
+        passage = {"talk_id": 1, "start_offset": 500, "end_offset": 600, "talk_entry": None,
+                   "_additional": {"answer": {"hasAnswer": False, "startPosition": 0, "endPosition": 0}}}
+        result = main.passage_answers([passage], limit=3)[0]
+        self.assertEqual(result["title"], "")
+        self.assertEqual(result["_additional"]["answer"]["startPosition"], 0)
+        self.assertEqual(passage["_additional"]["answer"]["startPosition"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
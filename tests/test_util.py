@@ -0,0 +1,127 @@
+import ast
+import random
+import re
+import unittest
+
+from util import parse_literal, split_in_passages, _tokenize_literal
+
+
+class ParseLiteralTest(unittest.TestCase):
+    """
+        parse_literal must return exactly what ast.literal_eval returns, and fail where it fails
+    """
+
+    def assert_same_as_literal_eval(self, text):
+        try:
+            expected = ast.literal_eval(text)
+        except (ValueError, SyntaxError) as error:
+            with self.assertRaises(type(error)):
+                parse_literal(text)
+            return
+        result = parse_literal(text)
+        self.assertEqual(result, expected)
+        self.assertEqual(repr(result), repr(expected))  # same types and same key order
+
+    def test_dataset_shapes(self):
+        for text in ["{0: 'Ken Robinson'}",
+                     "{0: 'Al Gore', 1: 'Tipper Gore', 12: 'x'}",
+                     "{-1: 'a'}",
+                     "{'en': ['Author', 'educator'], 'it': []}",
+                     "['alternative energy', 'cars', 'climate change']",
+                     "[0, -3, 42]",
+                     "[[1, 2], {'a': [3]}]",
+                     " \n[1,\n 2]\n"]:
+            with self.subTest(text=text):
+                self.assert_same_as_literal_eval(text)
+
+    def test_quotes(self):
+        for text in ['["it\'s", "Sir Ken\'s talk"]',
+                     "['she said \"hi\"']",
+                     "{\"don't\": 'a'}"]:
+            with self.subTest(text=text):
+                self.assert_same_as_literal_eval(text)
+
+    def test_empty(self):
+        for text in ["''", '""', "['']", "{'': ''}", "[]", "{}", "[[], {}]"]:
+            with self.subTest(text=text):
+                self.assert_same_as_literal_eval(text)
+
+    def test_escaped_strings_fall_back(self):
+        for text in ["['it\\'s']", "['a\\nb']", "['\\u00e8']", "{0: 'back\\\\slash'}"]:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    _tokenize_literal(text)
+                self.assert_same_as_literal_eval(text)
+
+    def test_outside_the_grammar_falls_back(self):
+        for text in ["[1.5]", "[None, True]", "(1, 2)", "[1_000]", "[1e3]", "{1, 2}", "[- 1]"]:
+            with self.subTest(text=text):
+                self.assert_same_as_literal_eval(text)
+
+    def test_rejected_by_the_tokenizer(self):
+        for text in ["[01]", "['a\nb']", '["a\nb"]', "[\u0661]", "[1]\xa0"]:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    _tokenize_literal(text)
+
+    def test_invalid_literals_fail(self):
+        for text in ["[01]", "['a\nb']", "[1,, 2]", "{0 'a'}", "[1", "['a']]"]:
+            with self.subTest(text=text):
+                self.assert_same_as_literal_eval(text)
+
+
+
+class SplitInPassagesTest(unittest.TestCase):
+
+    @staticmethod
+    def random_text(word_count, seed=0):
+        random_generator = random.Random(seed)
+        words = ["".join(random_generator.choice("abcdefghij") for _ in range(random_generator.randint(1, 12)))
+                 for _ in range(word_count)]
+        return " ".join(words) + "."
+
+    def assert_valid_passages(self, text, passage_length, overlap):
+        passages = split_in_passages(text, passage_length, overlap)
+        self.assertTrue(passages)
+        self.assertEqual(passages[0][0], 0)
+        self.assertEqual(passages[-1][1], len(text))
+
+        # the offsets are the ones of the text stored as TedTalkPassage.text by system_init
+        for start, end in passages:
+            self.assertTrue(0 <= start < end <= len(text))
+            self.assertLessEqual(end - start, passage_length)
+            self.assertFalse(text[start:end].startswith(" "))
+            self.assertTrue(end == len(text) or text[end] == " ")  # cut on a space
+
+        for (start, end), (next_start, next_end) in zip(passages, passages[1:]):
+            self.assertLess(start, next_start)
+            self.assertLess(end, next_end)
+            self.assertLessEqual(next_start, end)  # no gap between two passages
+            self.assertLessEqual(end - next_start, overlap)
+
+        # words shorter than the overlap are whole in at least one passage
+        for word in re.finditer(r"\S+", text):
+            self.assertTrue(any(start <= word.start() and word.end() <= end for start, end in passages),
+                            word.group())
+        return passages
+
+    def test_transcript(self):
+        for passage_length, overlap in [(1000, 200), (100, 20), (50, 15)]:
+            with self.subTest(passage_length=passage_length, overlap=overlap):
+                self.assert_valid_passages(self.random_text(2000), passage_length, overlap)
+
+    def test_short_text(self):
+        text = "A short transcript."
+        self.assertEqual(self.assert_valid_passages(text, 1000, 200), [(0, len(text))])
+
+    def test_text_without_spaces(self):
+        text = "x" * 250
+        self.assertEqual(split_in_passages(text, 100, 20), [(0, 100), (80, 180), (160, 250)])
+
+    def test_empty_text(self):
+        self.assertEqual(split_in_passages("", 100, 20), [])
+        self.assertEqual(split_in_passages("   ", 100, 20), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+# Tracing is switched on by setting TED_TRACE=1. When it is off, span returns a shared no-op context manager and
+# traced returns the function itself, so the instrumented code pays almost nothing
+enabled = os.environ.get("TED_TRACE", "") not in ("", "0")
+traces_dir = "cache/traces/"
+
+# (name, start in ns, duration in ns, thread id, args) of every finished span of this process
+spans = []
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter_ns() - self.start
+        spans.append((self.name, self.start, duration, threading.get_ident(), self.args))  # atomic in CPython
+        return False
+
+
+def span(name, **args):
+    """
+        Times the block of a with statement
+    :param name: span name, spans with the same name are aggregated together
+    :param args: optional values shown with the span in the Chrome trace
+    """
+    if not enabled:
+        return _no_span
+    return _Span(name, args or None)
+
+
+def traced(name=None):
+    """
+        Decorator version of span, the span name defaults to the function name
+    """
+    def decorator(function):
+        if not enabled:
+            return function
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def export_chrome_trace(path):
+    # Complete ("X") events with microsecond timestamps, to be opened with chrome://tracing or Perfetto
+    process_id = os.getpid()
+    events = []
+    for name, start, duration, thread_id, args in list(spans):
+        event = {"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000, "pid": process_id,
+                 "tid": thread_id}
+        if args:
+            event["args"] = args
+        events.append(event)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+def aggregate():
+    # name -> sorted durations in seconds
+    durations = {}
+    for name, _, duration, _, _ in list(spans):
+        durations.setdefault(name, []).append(duration / 1e9)
+    return {name: sorted(values) for name, values in durations.items()}
+
+
+def print_table():
+    rows = sorted(aggregate().items(), key=lambda item: sum(item[1]), reverse=True)
+    print(f"{'span':<40} {'count':>7} {'total':>10} {'mean':>10} {'p50':>10} {'max':>10}")
+    for name, values in rows:
+        total = sum(values)
+        print(f"{name:<40} {len(values):>7} {total:>9.3f}s {total / len(values) * 1000:>8.2f}ms "
+              f"{values[len(values) // 2] * 1000:>8.2f}ms {values[-1] * 1000:>8.2f}ms")
+
+
+def _finish():
+    # only the spans of this process are exported: the worker processes of the pools are not traced
+    if not spans:
+        return
+    path = os.path.join(traces_dir, f"trace-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.json")
+    export_chrome_trace(path)
+    print_table()
+    print(f"Chrome trace written to {path}")
+
+
+if enabled:
+    atexit.register(_finish)
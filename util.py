@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 import ast
 import os
+import re
 import zipfile
 import rfc3339
 
@@ -15,39 +17,185 @@ def extract(folder_path: str):
         print(folder_path, "does not exist")
 
 
+# Tokens of the restricted literal grammar used by the dataset: quoted strings without escapes, integers and the
+# punctuation of lists and dicts. Whatever Python rejects must not match either: strings spanning a line, integers
+# with leading zeros or non-ASCII digits. The whitespace is the one the Python tokenizer skips inside brackets
+_literal_token_pattern = re.compile(
+    r"""[ \t\f\r\n]*(?:'([^'\\\r\n]*)'|"([^"\\\r\n]*)"|(-?(?:0|[1-9][0-9]*))(?![0-9A-Za-z_.])|([\[\]{}:,]))""")
+
+
+def _tokenize_literal(text):
+    tokens = []
+    position = 0
+    text = text.rstrip(" \t\f\r\n")
+    while position < len(text):
+        match = _literal_token_pattern.match(text, position)
+        if match is None:
+            raise ValueError("Not a simple literal")
+        single_quoted, double_quoted, number, punctuation = match.groups()
+        if single_quoted is not None:
+            tokens.append(("value", single_quoted))
+        elif double_quoted is not None:
+            tokens.append(("value", double_quoted))
+        elif number is not None:
+            tokens.append(("value", int(number)))
+        else:
+            tokens.append((punctuation, None))
+        position = match.end()
+    return tokens
+
+
+def _parse_tokens(tokens, position):
+    kind, value = tokens[position]
+    if kind == "value":
+        return value, position + 1
+
+    if kind == "[":
+        result = []
+        position += 1
+        while tokens[position][0] != "]":
+            element, position = _parse_tokens(tokens, position)
+            result.append(element)
+            if tokens[position][0] == ",":
+                position += 1
+            elif tokens[position][0] != "]":
+                raise ValueError("Malformed list")
+        return result, position + 1
+
+    if kind == "{":
+        result = {}
+        position += 1
+        while tokens[position][0] != "}":
+            key, position = _parse_tokens(tokens, position)
+            if isinstance(key, list) or tokens[position][0] != ":":
+                raise ValueError("Malformed dict")
+            result[key], position = _parse_tokens(tokens, position + 1)
+            if tokens[position][0] == ",":
+                position += 1
+            elif tokens[position][0] != "}":
+                raise ValueError("Malformed dict")
+        return result, position + 1
+
+    raise ValueError("Unexpected token")
+
+
+def parse_literal(text):
+    """
+        Fast replacement for ast.literal_eval on the shapes found in the dataset: lists and dicts of strings and
+        integers. Anything outside this restricted grammar (escapes, floats, None, ...) goes through literal_eval.
+    :param text: python literal to parse
+    :return: the parsed value, exactly as ast.literal_eval would return it
+    """
+    try:
+        tokens = _tokenize_literal(text)
+        result, position = _parse_tokens(tokens, 0)
+        if position == len(tokens):
+            return result
+    except (ValueError, IndexError, TypeError):
+        pass
+    return ast.literal_eval(text)
+
+
 def dict_values_to_list_of_strings(dictionary_string):
+    return list(_dict_values_to_tuple_of_strings(dictionary_string))
+
+
+@lru_cache(maxsize=65536)
+def _dict_values_to_tuple_of_strings(dictionary_string):
     if len(dictionary_string) == 0:
-        return []
+        return ()
 
-    dictionary = ast.literal_eval(dictionary_string)
+    dictionary = parse_literal(dictionary_string)
     result = []
     for value in dictionary.values():
         if isinstance(value, list):
             result.extend(str(element) for element in value)
         else:
             result.append(str(value))
-    return result
+    return tuple(result)
 
 
 def dict_keys_to_list_of_strings(dictionary_string):
+    return list(_dict_keys_to_tuple_of_strings(dictionary_string))
+
+
+@lru_cache(maxsize=65536)
+def _dict_keys_to_tuple_of_strings(dictionary_string):
     if len(dictionary_string) == 0:
-        return []
+        return ()
 
-    dictionary = ast.literal_eval(dictionary_string)
+    dictionary = parse_literal(dictionary_string)
     result = []
     for key in dictionary.keys():
         if isinstance(key, list):
             result.extend(str(element) for element in key)
         else:
             result.append(str(key))
-    return result
+    return tuple(result)
 
 
 def list_string_to_python_list(list_string):
     if len(list_string) == 0:
         return []
     else:
-        return ast.literal_eval(list_string)
+        return parse_literal(list_string)
+
+
+# Columns stored as python literals in the CSV and the helper converting each of them
+column_converters = {
+    "all_speakers": dict_values_to_list_of_strings,
+    "occupations": dict_values_to_list_of_strings,
+    "about_speakers": dict_values_to_list_of_strings,
+    "available_lang": list_string_to_python_list,
+    "topics": list_string_to_python_list,
+    "related_talks": dict_keys_to_list_of_strings,
+}
+
+
+def convert_literal_columns(dataframe: "pd.DataFrame") -> "pd.DataFrame":
+    """
+        Converts every python literal column of the dataframe in place. Each distinct value of a column is parsed
+        only once and every row gets its own copy of the result.
+    :param dataframe: chunk of the ted talks CSV, with missing values already replaced by ""
+    :return: the same dataframe
+    """
+    import pandas as pd  # main.py imports this module for its menus: pandas is only loaded by the ingest
+
+    for column, converter in column_converters.items():
+        if column not in dataframe:
+            continue
+        codes, uniques = pd.factorize(dataframe[column])
+        converted_uniques = [converter(value) for value in uniques]
+        dataframe[column] = pd.Series([list(converted_uniques[code]) for code in codes],
+                                      index=dataframe.index, dtype=object)
+    return dataframe
+
+
+def split_in_passages(text: str, passage_length=1000, overlap=200) -> list:
+    """
+        Splits a long text in overlapping passages, cut on a space whenever possible
+    :param text: the text to split
+    :param passage_length: maximum number of characters of a passage
+    :param overlap: number of characters shared by two consecutive passages
+    :return: list of (start offset, end offset) pairs into text
+    """
+    passages = []
+    start = 0
+    while start < len(text):
+        end = min(start + passage_length, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + passage_length // 2, end)
+            if cut != -1:
+                end = cut
+        if text[start:end].strip():
+            passages.append((start, end))
+        if end == len(text):
+            break
+
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return passages
 
 
 def to_int(value):
@@ -110,4 +258,41 @@ def prettify_duration(seconds: int) -> str:
     :param seconds: timespan to prettify
     :return: timespan in a more human-readable string
     """
-    return str(timedelta(seconds=seconds))
\ No newline at end of file
+    return str(timedelta(seconds=seconds))
+
+
+def current_rss_kb():
+    # Resident set size of the process right now, in kilobytes. Only Linux exposes it without psutil
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+_last_rss_kb = current_rss_kb()
+
+
+def print_peak_memory(stage: str, include_children: bool = False) -> None:
+    """
+        Prints the resident set size after a stage, how much it changed since the previous stage and the peak reached
+        by the process so far. The peak alone only grows, so a stage that stays below an earlier one would not show
+    :param stage: name of the stage that just finished
+    :param include_children: also prints the peak of the largest worker process that has exited, for the stages
+        that run in a process pool, whose memory is not part of the main process
+    """
+    global _last_rss_kb
+    import resource  # Unix only
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kilobytes on Linux
+    message = f"[{stage}] peak RSS: {peak_rss_kb / 1024:.1f} MB"
+    rss_kb = current_rss_kb()
+    if rss_kb is not None:
+        delta = "" if _last_rss_kb is None else f" ({(rss_kb - _last_rss_kb) / 1024:+.1f} MB)"
+        message += f", RSS: {rss_kb / 1024:.1f} MB{delta}"
+        _last_rss_kb = rss_kb
+    if include_children:
+        children_peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        message += f", largest worker peak RSS: {children_peak_rss_kb / 1024:.1f} MB"
+    print(message)
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import weaviate
+
+from batch_writer import AdaptiveBatchWriter
+from ingest_manifest import manifest_path, delete_manifest
+from query_cache import bump_schema_version
+from util import ask_user_choice
+
+
+# Classes in restore order, with their reference properties and the class they point to
+snapshot_classes = {
+    "TedTalk": {"related_talks": "TedTalk"},
+    "TedTalkAudio": {"talk_entry": "TedTalk"},
+    "TedTalkPassage": {"talk_entry": "TedTalk"},
+}
+
+
+def class_exists(client, class_name):
+    return any(x for x in client.schema.get()["classes"] if x["class"] == class_name)
+
+
+def iter_objects(client, class_name, properties, references, page_size=200):
+    # Cursor pagination reads every object of the class with its vector, in uuid order
+    fields = properties + [f"{name} {{ ... on {target} {{ _additional {{ id }} }} }}"
+                           for name, target in references.items()]
+    cursor = None
+    while True:
+        query = client.query\
+            .get(class_name, fields)\
+            .with_additional(["id", "vector"])\
+            .with_limit(page_size)
+        if cursor is not None:
+            query = query.with_after(cursor)
+        page = query.do()["data"]["Get"][class_name]
+        if not page:
+            return
+        yield from page
+        cursor = page[-1]["_additional"]["id"]
+
+
+def export_class(client, class_schema, snapshot_dir, dtype):
+    """
+        Writes three kinds of files for the class: <class>.vectors.npy with one vector per row,
+        <class>.objects.jsonl with the uuid and the properties of the same row, and <class>.<reference>.npy with
+        the (from uuid, to uuid) pairs of every reference property
+    """
+    class_name = class_schema["class"]
+    references = snapshot_classes[class_name]
+    properties = [x["name"] for x in class_schema["properties"] if x["name"] not in references]
+
+    vectors = []
+    edges = {name: [] for name in references}
+    objects_path = os.path.join(snapshot_dir, f"{class_name}.objects.jsonl")
+    with open(objects_path, "w", encoding="utf-8") as objects_file:
+        for data_object in iter_objects(client, class_name, properties, references):
+            object_uuid = data_object["_additional"]["id"]
+            vectors.append(data_object["_additional"].get("vector"))
+            objects_file.write(json.dumps({
+                "id": object_uuid,
+                "properties": {name: data_object[name] for name in properties if data_object.get(name) is not None}
+            }, ensure_ascii=False) + "\n")
+            for name in references:
+                edges[name].extend((object_uuid, x["_additional"]["id"]) for x in data_object.get(name) or [])
+            print(f"\r{class_name}: {len(vectors)} objects", end="")
+    print(f"\r{class_name}: {len(vectors)} objects")
+
+    # objects without a vector get a row of NaNs, the restore lets Weaviate vectorize them again
+    dimension = max((len(vector) for vector in vectors if vector), default=0)
+    matrix = np.full((len(vectors), dimension), np.nan, dtype=dtype)
+    for row, vector in enumerate(vectors):
+        if vector:
+            matrix[row] = vector
+    np.save(os.path.join(snapshot_dir, f"{class_name}.vectors.npy"), matrix)
+
+    for name, pairs in edges.items():
+        np.save(os.path.join(snapshot_dir, f"{class_name}.{name}.npy"), np.array(pairs, dtype=str).reshape(-1, 2))
+
+    return {"count": len(vectors), "dimension": dimension, "references": {x: len(y) for x, y in edges.items()}}
+
+
+def export_snapshot(client, snapshot_dir, dtype=np.float16):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    start_time = time.perf_counter()
+
+    schema = {"classes": [x for x in client.schema.get()["classes"] if x["class"] in snapshot_classes]}
+    classes = {}
+    for class_schema in schema["classes"]:
+        classes[class_schema["class"]] = export_class(client, class_schema, snapshot_dir, dtype)
+
+    # the ingest manifest travels with the data, so that system_init can still update the restored database
+    if os.path.exists(manifest_path):
+        shutil.copyfile(manifest_path, os.path.join(snapshot_dir, "ingest_manifest.json"))
+
+    with open(os.path.join(snapshot_dir, "snapshot.json"), "w", encoding="utf-8") as snapshot_file:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "dtype": np.dtype(dtype).name,
+            "schema": schema,
+            "classes": classes
+        }, snapshot_file, indent=2)
+    print(f"Snapshot written to {snapshot_dir} in {time.perf_counter() - start_time:.1f}s")
+
+
+def restore_class(batch, snapshot_dir, class_name):
+    vectors = np.load(os.path.join(snapshot_dir, f"{class_name}.vectors.npy"), mmap_mode="r")
+    with open(os.path.join(snapshot_dir, f"{class_name}.objects.jsonl"), "r", encoding="utf-8") as objects_file:
+        for row, line in enumerate(objects_file):
+            entry = json.loads(line)
+            vector = np.asarray(vectors[row], dtype=np.float32)
+            batch.add_data_object(
+                data_object=entry["properties"],
+                class_name=class_name,
+                uuid=entry["id"],
+                vector=None if np.isnan(vector).any() else vector
+            )
+
+
+def restore_snapshot(client, snapshot_dir):
+    # Every object is written with its stored vector, so neither t2v-transformers nor wav2vec2 run again
+    start_time = time.perf_counter()
+    with open(os.path.join(snapshot_dir, "snapshot.json"), "r", encoding="utf-8") as snapshot_file:
+        snapshot = json.load(snapshot_file)
+
+    existing_classes = [x for x in snapshot_classes if class_exists(client, x)]
+    if existing_classes:
+        _, choice = ask_user_choice(f"{', '.join(existing_classes)} already exist: what do you want to do?",
+                                    ["Delete them and restore the snapshot", "Quit"])
+        if choice == "Quit":
+            print("Quitting with no changes.")
+            return
+        for class_name in reversed(existing_classes):
+            client.schema.delete_class(class_name)
+
+    # the manifest of the deleted data no longer applies, the one of the snapshot is copied once the restore is done
+    delete_manifest()
+    print("Creating database schema...")
+    client.schema.create(snapshot["schema"])
+    bump_schema_version()  # the cached query results of main.py are no longer valid
+
+    restored_classes = [x for x in snapshot_classes if x in snapshot["classes"]]
+    with AdaptiveBatchWriter(client) as batch:
+        for class_name in restored_classes:
+            print(f"Restoring {snapshot['classes'][class_name]['count']} {class_name} objects...")
+            restore_class(batch, snapshot_dir, class_name)
+
+        # the batch writer sends all the objects before the first reference
+        for class_name in restored_classes:
+            for name, target in snapshot_classes[class_name].items():
+                edges = np.load(os.path.join(snapshot_dir, f"{class_name}.{name}.npy"))
+                batch.add_references(edges, class_name, name, target)
+    # bumped again once the batch is flushed: a query run by main.py during the restore cached a partial result, or
+    # synced a partial audio index, under the version bumped above
+    bump_schema_version()
+
+    snapshot_manifest_path = os.path.join(snapshot_dir, "ingest_manifest.json")
+    if os.path.exists(snapshot_manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        shutil.copyfile(snapshot_manifest_path, manifest_path)
+    print(f"Snapshot restored in {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exports the TedTalk, TedTalkAudio and TedTalkPassage objects with "
+                                                 "their vectors and references, or restores them without "
+                                                 "computing any embedding")
+    parser.add_argument("action", choices=["export", "restore"])
+    parser.add_argument("snapshot_dir", help="directory of the snapshot")
+    parser.add_argument("--float32", action="store_true",
+                        help="export the vectors as float32 instead of float16 (twice the size, exact restore)")
+    parser.add_argument("--url", default="http://localhost:8080", help="weaviate url")
+    arguments = parser.parse_args()
+
+    client = weaviate.Client(arguments.url)
+    if arguments.action == "export":
+        export_snapshot(client, arguments.snapshot_dir, np.float32 if arguments.float32 else np.float16)
+    else:
+        restore_snapshot(client, arguments.snapshot_dir)
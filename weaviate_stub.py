@@ -0,0 +1,135 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WeaviateStub:
+    """
+        In-process stand-in for the few Weaviate REST endpoints used by system_init: meta/readiness, schema and the
+        objects/references batch endpoints. Objects and references are kept in memory, so ingest runs can be timed
+        without the docker-compose stack. latency_per_object simulates the vectorizer cost of a real server.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_per_object=0.0):
+        self.classes = {}
+        self.objects = {}  # uuid -> object
+        self.references = []  # (from beacon, to beacon)
+        self.request_counts = {}
+        self.latency_per_object = latency_per_object
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # keep the benchmark output clean
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length)) if length else None
+
+            def _reply(self, status, body=None):
+                payload = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self, method):
+                path = self.path.split("?")[0]
+                body = self._read_body() if method in ("POST", "PUT", "PATCH") else None
+                status, response = stub.handle(method, path, body)
+                self._reply(status, response)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def handle(self, method, path, body):
+        with self.lock:
+            endpoint = re.sub(r"/v1/(schema|objects)/.*", r"/v1/\1/*", path)
+            key = f"{method} {endpoint}"
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+        if path in ("/v1/.well-known/ready", "/v1/.well-known/live"):
+            return 200, None
+        if path == "/v1/meta":
+            return 200, {"hostname": "http://[::]:8080", "version": "1.27.0", "modules": {}}
+        if path == "/v1/nodes":
+            return 200, {"nodes": [{"name": "stub", "status": "HEALTHY", "version": "1.27.0", "shards": []}]}
+
+        if path == "/v1/schema":
+            if method == "GET":
+                return 200, {"classes": list(self.classes.values())}
+            with self.lock:
+                body.setdefault("properties", [])
+                self.classes[body["class"]] = body
+            return 200, body
+
+        match = re.fullmatch(r"/v1/schema/(\w+)(/properties)?", path)
+        if match:
+            class_name, properties = match.groups()
+            if class_name not in self.classes:
+                return 404, None
+            if method == "DELETE":
+                with self.lock:
+                    del self.classes[class_name]
+                    self.objects = {k: v for k, v in self.objects.items() if v.get("class") != class_name}
+                return 200, None
+            if properties:
+                with self.lock:
+                    self.classes[class_name]["properties"].append(body)
+                return 200, body
+            return 200, self.classes[class_name]
+
+        if path == "/v1/batch/objects":
+            objects = body.get("objects", [])
+            time.sleep(self.latency_per_object * len(objects))
+            with self.lock:
+                for data_object in objects:
+                    self.objects[data_object["id"]] = data_object
+            return 200, [dict(data_object, result={}) for data_object in objects]
+
+        if path == "/v1/batch/references":
+            with self.lock:
+                self.references.extend((reference["from"], reference["to"]) for reference in body)
+            return 200, [{"from": r["from"], "to": r["to"], "result": {"status": "SUCCESS"}} for r in body]
+
+        return 404, {"error": [{"message": f"{method} {path} is not supported by the stub"}]}